@@ -0,0 +1,265 @@
+"""Record responses from a live CAVEclient to disk, and serve them back offline.
+
+`RecordingClient` wraps a real `CAVEclient` and saves the result of every call made
+through `client.chunkedgraph`, `client.l2cache`, `client.materialize` and
+`client.info` (as well as plain attributes like `client.timestamp`). `ReplayClient`
+reads those recordings back, optionally with artificial latency, and counts the
+requests made to each method. Together they let the extraction pipelines be run and
+benchmarked on a machine with no network access.
+
+Each response is stored in its own pickle file, keyed by the method name and a hash
+of its arguments, so recording from many threads or worker processes at once is safe.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+import pandas as pd
+from requests.exceptions import HTTPError
+
+SERVICES = ("chunkedgraph", "l2cache", "materialize", "info")
+
+ATTRIBUTE_FILE = "attribute.pkl"
+
+
+class MissingRecordingError(LookupError):
+    """Raised when a `ReplayClient` is asked for a response that was never recorded."""
+
+
+def _canonicalize(value: Any) -> Any:
+    # convert arguments into JSON-serializable values which compare equal whenever
+    # the arguments do, regardless of container or integer type
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value)
+    if isinstance(value, (np.ndarray, pd.Index, pd.Series)):
+        return _canonicalize(np.asarray(value).tolist())
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {"set": sorted(_canonicalize(item) for item in value)}
+    if isinstance(value, dict):
+        return {"dict": sorted((str(k), _canonicalize(v)) for k, v in value.items())}
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    return {"repr": repr(value)}
+
+
+def _call_key(args: tuple, kwargs: dict) -> str:
+    canonical = json.dumps(
+        [_canonicalize(args), _canonicalize(kwargs)], sort_keys=True, default=str
+    )
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def _write_atomic(path: Path, payload: tuple) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        pickle.dump(payload, f)
+    os.replace(f.name, path)
+
+
+def _picklable_error(error: Exception) -> Exception:
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        if isinstance(error, HTTPError):
+            return HTTPError(str(error))
+        return RuntimeError(repr(error))
+
+
+class _RecordingProxy:
+    def __init__(self, target: Any, qualname: str, path: Path):
+        self._target = target
+        self._qualname = qualname
+        self._path = path
+        self._attributes = {}
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        qualname = f"{self._qualname}.{name}" if self._qualname else name
+        if not self._qualname and name in SERVICES:
+            return _RecordingProxy(getattr(self._target, name), qualname, self._path)
+
+        if name in self._attributes:
+            return self._attributes[name]
+        value = getattr(self._target, name)
+        if callable(value):
+            return self._make_recorder(value, qualname)
+
+        # attributes are read once and frozen, so that values like `client.timestamp`
+        # stay consistent across all of the calls that use them
+        self._attributes[name] = value
+        _write_atomic(self._path / qualname / ATTRIBUTE_FILE, ("value", value))
+        return value
+
+    def _make_recorder(self, method, qualname: str):
+        def record(*args, **kwargs):
+            path = self._path / qualname / f"{_call_key(args, kwargs)}.pkl"
+            try:
+                result = method(*args, **kwargs)
+            except Exception as error:
+                _write_atomic(path, ("error", _picklable_error(error)))
+                raise
+            _write_atomic(path, ("value", result))
+            return result
+
+        return record
+
+
+class RecordingClient(_RecordingProxy):
+    def __init__(self, client, path: Union[str, Path]):
+        """
+        A wrapper around a `CAVEclient` which records every response to disk.
+
+        Use this in place of the client when running a pipeline once with network
+        access, then use `ReplayClient` with the same `path` to run it again offline.
+
+        Parameters
+        ----------
+        client :
+            The `CAVEclient` to record responses from.
+        path :
+            Directory to write recordings into. Recordings from several runs can share
+            a directory.
+        """
+        super().__init__(client, "", Path(path))
+
+
+class _ReplayProxy:
+    def __init__(self, client: "ReplayClient", qualname: str):
+        self._client = client
+        self._qualname = qualname
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        qualname = f"{self._qualname}.{name}" if self._qualname else name
+        return self._client._resolve(qualname, is_service=not self._qualname)
+
+
+class ReplayClient(_ReplayProxy):
+    def __init__(
+        self,
+        path: Union[str, Path],
+        latency: Union[float, dict[str, float]] = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        A stand-in for a `CAVEclient` which serves responses recorded by
+        `RecordingClient`.
+
+        Calls are looked up by method name and arguments. A call which was not
+        recorded raises `MissingRecordingError`, and a call which raised an error when
+        it was recorded raises the same error again.
+
+        Parameters
+        ----------
+        path :
+            Directory that recordings were written into.
+        latency :
+            Artificial latency in seconds added to each call. Can also be a dictionary
+            mapping method names like `"chunkedgraph.level2_chunk_graph"` to a latency
+            for that method, with the key `"default"` used for any other method.
+        jitter :
+            Each latency is scaled by a random factor in `[1 - jitter, 1 + jitter]`.
+        seed :
+            Seed for the jitter.
+
+        Notes
+        -----
+        `request_counts` only counts calls made in the current process. When this
+        client is sent to worker processes (e.g. by `joblib` with the default `loky`
+        backend), calls made in those workers are not counted here.
+        """
+        super().__init__(self, "")
+        self._path = Path(path)
+        if not self._path.is_dir():
+            raise FileNotFoundError(f"No recordings found at {self._path}")
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._attributes = {}
+        self.request_counts = Counter()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def total_requests(self) -> int:
+        """The total number of calls made to this client."""
+        return sum(self.request_counts.values())
+
+    def reset_counts(self) -> None:
+        """Reset `request_counts` to zero."""
+        with self._lock:
+            self.request_counts.clear()
+
+    def _latency_for(self, qualname: str) -> float:
+        if isinstance(self.latency, dict):
+            latency = self.latency.get(qualname, self.latency.get("default", 0.0))
+        else:
+            latency = self.latency
+        if self.jitter > 0:
+            with self._lock:
+                latency *= 1 + self.jitter * (2 * self._rng.random() - 1)
+        return latency
+
+    def _resolve(self, qualname: str, is_service: bool) -> Any:
+        directory = self._path / qualname
+        attribute_path = directory / ATTRIBUTE_FILE
+        if attribute_path.exists():
+            if qualname not in self._attributes:
+                with open(attribute_path, "rb") as f:
+                    self._attributes[qualname] = pickle.load(f)[1]
+            return self._attributes[qualname]
+        if directory.is_dir():
+            return self._make_replayer(qualname)
+        if is_service and qualname in SERVICES:
+            return _ReplayProxy(self, qualname)
+        raise AttributeError(f"No recordings for `{qualname}` in {self._path}")
+
+    def _make_replayer(self, qualname: str):
+        def replay(*args, **kwargs):
+            with self._lock:
+                self.request_counts[qualname] += 1
+            path = self._path / qualname / f"{_call_key(args, kwargs)}.pkl"
+            try:
+                with open(path, "rb") as f:
+                    kind, result = pickle.load(f)
+            except FileNotFoundError:
+                raise MissingRecordingError(
+                    f"No recording of `{qualname}` for args={args!r}, kwargs={kwargs!r}"
+                )
+            latency = self._latency_for(qualname)
+            if latency > 0:
+                time.sleep(latency)
+            if kind == "error":
+                raise result
+            return result
+
+        return replay
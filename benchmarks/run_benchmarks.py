@@ -0,0 +1,232 @@
+"""Benchmark the replay and diff hot paths of paleo on synthetic lineages.
+
+Reports the wall time and peak traced memory of each benchmarked function, so that
+regressions and speedups can be tracked without access to a CAVE deployment.
+
+Example
+-------
+    python benchmarks/run_benchmarks.py --n-nodes 100000 --n-edits 1000
+    python benchmarks/run_benchmarks.py --functions apply_edit_sequence --output out.csv
+
+Benchmarks with "csr" in their name replay the same edits on a `CSRGraph` instead of a
+`networkx.Graph`, for comparing the two.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from synthetic import SyntheticLineage, make_lineage
+
+from paleo import (
+    apply_edit_sequence,
+    compare_graphs,
+    compare_skeletons,
+    get_metaedits,
+)
+from paleo.networkdelta import combine_deltas
+
+
+def _final_arrays(lineage: SyntheticLineage) -> tuple[np.ndarray, np.ndarray]:
+    graph = lineage.to_csr()
+    for delta in lineage.edits.values():
+        graph.remove_nodes_from(delta.removed_nodes.tolist())
+        graph.add_nodes_from(delta.added_nodes.tolist())
+        graph.add_edges_from(delta.added_edges.tolist())
+    graph.compact()
+    return graph.nodes(), graph.edges()
+
+
+def _make_skeleton(lineage: SyntheticLineage, nodes, edges) -> SimpleNamespace:
+    # a stand-in with the `vertices` and `edges` attributes of a skeleton
+    nodes = np.asarray(nodes)
+    vertices = np.array([lineage.positions[node] for node in nodes.tolist()])
+    edges = np.searchsorted(nodes, edges)
+    return SimpleNamespace(vertices=vertices, edges=edges)
+
+
+def _setup_compare_graphs(lineage):
+    before = (lineage.nodes, lineage.edges)
+    after = _final_arrays(lineage)
+    return lambda: compare_graphs(before, after)
+
+
+def _setup_apply_edit_sequence(lineage):
+    graph = lineage.to_networkx()
+    return lambda: apply_edit_sequence(
+        graph, lineage.edits, lineage.anchor_nodes, verbose=False
+    )
+
+
+def _setup_apply_edit_sequence_csr(lineage):
+    graph = lineage.to_csr()
+    return lambda: apply_edit_sequence(
+        graph, lineage.edits, lineage.anchor_nodes, verbose=False
+    )
+
+
+def _setup_apply_edit_sequence_history(lineage):
+    graph = lineage.to_networkx()
+    return lambda: apply_edit_sequence(
+        graph,
+        lineage.edits,
+        lineage.anchor_nodes,
+        return_graphs=True,
+        verbose=False,
+        return_as="history",
+    )
+
+
+def _setup_apply_edit_sequence_history_csr(lineage):
+    graph = lineage.to_csr()
+    return lambda: apply_edit_sequence(
+        graph,
+        lineage.edits,
+        lineage.anchor_nodes,
+        return_graphs=True,
+        verbose=False,
+        return_as="history",
+    )
+
+
+def _setup_get_metaedits(lineage):
+    return lambda: get_metaedits(lineage.edits)
+
+
+def _setup_combine_deltas(lineage):
+    deltas = list(lineage.edits.values())
+    return lambda: combine_deltas(deltas)
+
+
+def _setup_compare_skeletons(lineage):
+    skeleton_before = _make_skeleton(lineage, lineage.nodes, lineage.edges)
+    skeleton_after = _make_skeleton(lineage, *_final_arrays(lineage))
+    return lambda: compare_skeletons(skeleton_before, skeleton_after)
+
+
+BENCHMARKS: dict[str, Callable] = {
+    "compare_graphs": _setup_compare_graphs,
+    "apply_edit_sequence": _setup_apply_edit_sequence,
+    "apply_edit_sequence[csr]": _setup_apply_edit_sequence_csr,
+    "apply_edit_sequence[history]": _setup_apply_edit_sequence_history,
+    "apply_edit_sequence[history,csr]": _setup_apply_edit_sequence_history_csr,
+    "get_metaedits": _setup_get_metaedits,
+    "combine_deltas": _setup_combine_deltas,
+    "compare_skeletons": _setup_compare_skeletons,
+}
+
+
+def measure(func: Callable, repeat: int = 1) -> dict:
+    """Run `func` `repeat` times, returning the best wall time in seconds, then once
+    more with memory tracing on, returning the peak traced memory in MB.
+
+    Timing and memory are measured in separate runs since tracing allocations slows
+    down Python code considerably.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"time_s": min(times), "peak_memory_mb": peak / 1e6}
+
+
+def run_benchmarks(
+    n_nodes: int = 10_000,
+    n_edits: int = 100,
+    functions=None,
+    repeat: int = 1,
+    seed: int = 0,
+    verbose: bool = True,
+) -> pd.DataFrame:
+    """Run the benchmarks on a synthetic lineage of the given size.
+
+    Parameters
+    ----------
+    n_nodes :
+        Number of nodes in the initial synthetic graph.
+    n_edits :
+        Number of edits in the synthetic history.
+    functions :
+        Names of the benchmarks to run. Defaults to all of `BENCHMARKS`.
+    repeat :
+        Number of times to run each benchmark.
+    seed :
+        Seed for generating the synthetic lineage.
+    verbose :
+        Whether to print each result as it is measured.
+
+    Returns
+    -------
+    :
+        A table with one row per benchmark.
+    """
+    if functions is None:
+        functions = list(BENCHMARKS.keys())
+
+    start = time.perf_counter()
+    lineage = make_lineage(n_nodes=n_nodes, n_edits=n_edits, seed=seed)
+    if verbose:
+        print(
+            f"Generated lineage with {len(lineage.nodes)} nodes, "
+            f"{len(lineage.edges)} edges and {len(lineage.edits)} edits in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+    rows = []
+    for name in functions:
+        func = BENCHMARKS[name](lineage)
+        result = measure(func, repeat=repeat)
+        row = {"function": name, "n_nodes": n_nodes, "n_edits": n_edits, **result}
+        rows.append(row)
+        if verbose:
+            print(
+                f"{name:<32} {result['time_s']:>10.4f}s "
+                f"{result['peak_memory_mb']:>10.1f}MB"
+            )
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--n-nodes", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--n-edits", type=int, nargs="+", default=[100])
+    parser.add_argument(
+        "--functions", nargs="+", choices=list(BENCHMARKS.keys()), default=None
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Path for a CSV.")
+    args = parser.parse_args()
+
+    results = []
+    for n_nodes in args.n_nodes:
+        for n_edits in args.n_edits:
+            results.append(
+                run_benchmarks(
+                    n_nodes=n_nodes,
+                    n_edits=n_edits,
+                    functions=args.functions,
+                    repeat=args.repeat,
+                    seed=args.seed,
+                )
+            )
+    results = pd.concat(results, ignore_index=True)
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark the extraction pipelines of paleo against recorded CAVE responses.
+
+First, record the responses for a few roots once, with network access:
+
+    python benchmarks/run_extraction_benchmarks.py record \\
+        --datastack minnie65_public --root-ids 864691135639556411 --path recordings
+
+Then, replay them offline, with optional artificial latency per request:
+
+    python benchmarks/run_extraction_benchmarks.py replay \\
+        --root-ids 864691135639556411 --path recordings --latency 0.05
+
+Replaying reports the wall time and the number of requests made by each pipeline, and
+the number of calls which were saved by sharing identical requests in flight.
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import pandas as pd
+from recorded_client import RecordingClient, ReplayClient
+
+from paleo import (
+    get_executor,
+    get_initial_graph,
+    get_mutable_synapses,
+    get_nodes_aliases,
+    get_nucleus_supervoxel,
+    get_request_scheduler,
+    get_root_level2_edits,
+    set_executor,
+)
+
+
+def _pipelines(root_id: int, client) -> dict[str, Callable]:
+    # the edits are needed by the synapse pipeline, so are computed up front
+    edits = {}
+
+    def root_level2_edits():
+        edits.update(get_root_level2_edits(root_id, client, verbose=False))
+
+    def initial_graph():
+        get_initial_graph(root_id, client, verbose=False)
+
+    def mutable_synapses():
+        get_mutable_synapses(root_id, edits, client)
+
+    def nodes_aliases():
+        supervoxel_id = get_nucleus_supervoxel(root_id, client)
+        get_nodes_aliases([supervoxel_id], client, verbose=False)
+
+    return {
+        "get_root_level2_edits": root_level2_edits,
+        "get_initial_graph": initial_graph,
+        "get_mutable_synapses": mutable_synapses,
+        "get_nodes_aliases": nodes_aliases,
+    }
+
+
+def record(datastack: str, root_ids: list[int], path: str, server_address=None):
+    """Run every pipeline for each root against a live client, recording all
+    responses into `path`."""
+    from caveclient import CAVEclient
+
+    client = RecordingClient(
+        CAVEclient(datastack, server_address=server_address), path
+    )
+    for root_id in root_ids:
+        for name, pipeline in _pipelines(root_id, client).items():
+            print(f"Recording {name} for {root_id}")
+            pipeline()
+
+
+def replay(
+    root_ids: list[int],
+    path: str,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    executor: str = "threads",
+) -> pd.DataFrame:
+    """Run every pipeline for each root against recorded responses.
+
+    Parameters
+    ----------
+    root_ids :
+        Root IDs which were recorded.
+    path :
+        Directory containing the recordings.
+    latency :
+        Artificial latency in seconds added to each request.
+    jitter :
+        Relative random variation in the latency of each request.
+    executor :
+        The executor to run the pipelines with; see `paleo.set_executor`. Requests
+        made in worker processes are not counted, so threads are used by default to
+        get complete request counts.
+
+    Returns
+    -------
+    :
+        A table of the wall time, number of requests and number of coalesced calls
+        for each pipeline and root.
+    """
+    client = ReplayClient(path, latency=latency, jitter=jitter, seed=0)
+    scheduler = get_request_scheduler()
+    rows = []
+    previous_executor = get_executor()
+    set_executor(executor)
+    try:
+        for root_id in root_ids:
+            for name, pipeline in _pipelines(root_id, client).items():
+                client.reset_counts()
+                if scheduler is not None:
+                    scheduler.stats.clear()
+                start = time.perf_counter()
+                pipeline()
+                elapsed = time.perf_counter() - start
+                rows.append(
+                    {
+                        "root_id": root_id,
+                        "pipeline": name,
+                        "time_s": elapsed,
+                        "n_requests": client.total_requests,
+                        "n_coalesced": (
+                            scheduler.stats["coalesced"] if scheduler is not None else 0
+                        ),
+                        **{
+                            f"n_{method}": count
+                            for method, count in client.request_counts.items()
+                        },
+                    }
+                )
+                print(
+                    f"{root_id} {name:<24} {elapsed:>10.3f}s "
+                    f"{client.total_requests:>8} requests"
+                )
+    finally:
+        set_executor(previous_executor)
+    return pd.DataFrame(rows).fillna(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("--datastack", type=str, required=True)
+    record_parser.add_argument("--server-address", type=str, default=None)
+    record_parser.add_argument("--root-ids", type=int, nargs="+", required=True)
+    record_parser.add_argument("--path", type=str, required=True)
+
+    replay_parser = subparsers.add_parser("replay")
+    replay_parser.add_argument("--root-ids", type=int, nargs="+", required=True)
+    replay_parser.add_argument("--path", type=str, required=True)
+    replay_parser.add_argument("--latency", type=float, default=0.0)
+    replay_parser.add_argument("--jitter", type=float, default=0.0)
+    replay_parser.add_argument(
+        "--executor", choices=["serial", "threads", "processes"], default="threads"
+    )
+    replay_parser.add_argument("--output", type=str, default=None)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.datastack, args.root_ids, args.path, args.server_address)
+    else:
+        results = replay(
+            args.root_ids,
+            args.path,
+            latency=args.latency,
+            jitter=args.jitter,
+            executor=args.executor,
+        )
+        if args.output is not None:
+            results.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Generators for synthetic level2 graphs and edit histories.
+
+The graphs mimic the structure of a level2 graph for a single neuron: a sparse,
+spatially embedded, mostly tree-like graph, surrounded by small detached fragments
+which can be merged on later. Edits are spatially local, and replace the level2 nodes
+around the edit with new ones the way the chunkedgraph does, so every edge added by an
+edit touches a new node and every edge removed touches a removed node.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+
+from paleo import CSRGraph, NetworkDelta
+
+# level2 IDs are large uint64 values with the layer encoded in the top bits
+LEVEL2_ID_OFFSET = 2 << 56
+
+STEP_NM = 1000.0
+
+
+@dataclass
+class SyntheticLineage:
+    """An initial level2 graph along with a sequence of edits to it.
+
+    Attributes
+    ----------
+    nodes :
+        Node IDs of the initial graph.
+    edges :
+        Edges of the initial graph, as an (n_edges, 2) array.
+    edits :
+        A dictionary mapping operation IDs to the `NetworkDelta` for each edit, in
+        order.
+    anchor_nodes :
+        Nodes which are on the main object at every point in the history, for use as
+        `anchor_nodes` in `apply_edit_sequence`.
+    positions :
+        A dictionary mapping every node ID ever used to its position in nm.
+    """
+
+    nodes: np.ndarray
+    edges: np.ndarray
+    edits: dict[int, NetworkDelta]
+    anchor_nodes: list
+    positions: dict = field(repr=False)
+
+    def to_networkx(self) -> nx.Graph:
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes.tolist())
+        graph.add_edges_from(self.edges.tolist())
+        return graph
+
+    def to_csr(self) -> CSRGraph:
+        return CSRGraph.from_arrays(self.nodes, self.edges)
+
+
+def _grow_tree(
+    rng: np.random.Generator,
+    n_nodes: int,
+    start_position: np.ndarray,
+    branch_probability: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    # grow a branching random walk from a single point; returns positions and edges
+    # as indices into the positions array
+    positions = np.empty((n_nodes, 3))
+    positions[0] = start_position
+    edges = np.empty((max(n_nodes - 1, 0), 2), dtype=np.int64)
+
+    directions = rng.normal(size=(n_nodes, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    branch_draws = rng.random(n_nodes)
+    tip_draws = rng.random(n_nodes)
+
+    tips = [0]
+    tip_headings = [directions[0]]
+    for i in range(1, n_nodes):
+        tip_index = int(tip_draws[i] * len(tips))
+        parent = tips[tip_index]
+        # keep heading in roughly the same direction, like a neurite
+        heading = tip_headings[tip_index] + 0.5 * directions[i]
+        heading /= np.linalg.norm(heading)
+        positions[i] = positions[parent] + STEP_NM * heading
+        edges[i - 1] = (parent, i)
+        if branch_draws[i] < branch_probability:
+            tips.append(i)
+            tip_headings.append(directions[i])
+        else:
+            tips[tip_index] = i
+            tip_headings[tip_index] = heading
+    return positions, edges
+
+
+def make_lineage(
+    n_nodes: int = 10_000,
+    n_edits: int = 100,
+    merge_fraction: float = 0.5,
+    fragment_fraction: float = 0.2,
+    fragment_size: int = 50,
+    branch_probability: float = 0.02,
+    cycle_fraction: float = 0.02,
+    seed: Optional[int] = None,
+) -> SyntheticLineage:
+    """Generate a synthetic level2 graph and a sequence of edits to it.
+
+    Parameters
+    ----------
+    n_nodes :
+        Approximate number of nodes in the initial graph, including fragments.
+    n_edits :
+        Number of edits to generate.
+    merge_fraction :
+        Fraction of edits which are merges; the rest are splits.
+    fragment_fraction :
+        Fraction of the initial nodes which are in detached fragments rather than on
+        the main object.
+    fragment_size :
+        Number of nodes in each fragment.
+    branch_probability :
+        Probability that each new node starts a new branch.
+    cycle_fraction :
+        Number of extra edges between nearby nodes, as a fraction of the number of
+        nodes. Real level2 graphs are not quite trees.
+    seed :
+        Seed for the random number generator.
+
+    Returns
+    -------
+    :
+        The initial graph and edit sequence.
+    """
+    rng = np.random.default_rng(seed)
+
+    n_fragment_nodes = int(n_nodes * fragment_fraction)
+    n_fragments = n_fragment_nodes // fragment_size if fragment_size > 0 else 0
+    n_main_nodes = max(n_nodes - n_fragments * fragment_size, 1)
+
+    all_positions = []
+    all_edges = []
+    is_fragment = []
+    n_so_far = 0
+    main_positions, main_edges = _grow_tree(
+        rng, n_main_nodes, np.zeros(3), branch_probability
+    )
+    all_positions.append(main_positions)
+    all_edges.append(main_edges)
+    is_fragment.append(np.zeros(n_main_nodes, dtype=bool))
+    n_so_far += n_main_nodes
+
+    # fragments start somewhere near the main object
+    for _ in range(n_fragments):
+        anchor = main_positions[rng.integers(n_main_nodes)]
+        start = anchor + rng.normal(scale=3 * STEP_NM, size=3)
+        positions, edges = _grow_tree(rng, fragment_size, start, branch_probability)
+        all_positions.append(positions)
+        all_edges.append(edges + n_so_far)
+        is_fragment.append(np.ones(fragment_size, dtype=bool))
+        n_so_far += fragment_size
+
+    positions = np.concatenate(all_positions)
+    edges = np.concatenate(all_edges)
+    is_fragment = np.concatenate(is_fragment)
+
+    # close a few loops on the main object between nodes a couple of steps apart
+    n_cycles = int(cycle_fraction * n_main_nodes)
+    if n_cycles > 0 and n_main_nodes > 3:
+        sources = rng.integers(0, n_main_nodes - 3, size=n_cycles)
+        targets = sources + rng.integers(2, 4, size=n_cycles)
+        cycle_edges = np.stack((sources, targets), axis=1)
+        edges = np.concatenate((edges, cycle_edges))
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    node_ids = LEVEL2_ID_OFFSET + np.arange(len(positions), dtype=np.int64)
+    edges = node_ids[edges]
+
+    lineage = SyntheticLineage(
+        nodes=node_ids,
+        edges=edges,
+        edits={},
+        anchor_nodes=[int(node_ids[0])],
+        positions=dict(zip(node_ids.tolist(), map(tuple, positions))),
+    )
+    lineage.edits = _make_edits(
+        rng, lineage, is_fragment, n_edits=n_edits, merge_fraction=merge_fraction
+    )
+    return lineage
+
+
+def _make_edits(
+    rng: np.random.Generator,
+    lineage: SyntheticLineage,
+    is_fragment: np.ndarray,
+    n_edits: int,
+    merge_fraction: float,
+) -> dict[int, NetworkDelta]:
+    graph = lineage.to_csr()
+    positions = lineage.positions
+    protected = set(lineage.anchor_nodes)
+
+    # alive nodes on the main object and on fragments, with O(1) removal
+    pools = {False: [], True: []}
+    pool_index = {}
+    for node, fragment in zip(lineage.nodes.tolist(), is_fragment.tolist()):
+        pool_index[node] = (fragment, len(pools[fragment]))
+        pools[fragment].append(node)
+
+    def pool_remove(node):
+        fragment, index = pool_index.pop(node)
+        pool = pools[fragment]
+        last = pool.pop()
+        if last != node:
+            pool[index] = last
+            pool_index[last] = (fragment, index)
+
+    def pool_add(node, fragment):
+        pool_index[node] = (fragment, len(pools[fragment]))
+        pools[fragment].append(node)
+
+    def sample(fragment):
+        pool = pools[fragment]
+        while True:
+            node = pool[rng.integers(len(pool))]
+            if node not in protected:
+                return node
+
+    next_id = int(lineage.nodes.max()) + 1
+    edits = {}
+    for operation_id in range(n_edits):
+        is_merge = rng.random() < merge_fraction and len(pools[True]) > 0
+        if is_merge:
+            source = sample(False)
+            target = sample(True)
+            region = {source, target}
+        else:
+            source = sample(False)
+            region = {source}
+            region.update(
+                neighbor for neighbor in graph.neighbors(source)
+                if neighbor not in protected
+            )
+
+        # replace every node in the region with a new node, as the chunkedgraph does
+        replacements = {}
+        for node in sorted(region):
+            replacements[node] = next_id
+            positions[next_id] = positions[node]
+            next_id += 1
+
+        removed_edges = set()
+        added_edges = set()
+        for node in region:
+            for neighbor in graph.neighbors(node):
+                removed_edges.add((min(node, neighbor), max(node, neighbor)))
+                new_edge = (replacements[node], replacements.get(neighbor, neighbor))
+                added_edges.add((min(new_edge), max(new_edge)))
+
+        if is_merge:
+            added_edges.add((replacements[source], replacements[target]))
+        else:
+            # cut the new source node off from one of its new neighbors
+            cuttable = [
+                edge
+                for edge in added_edges
+                if replacements[source] in edge
+                and edge[0] in replacements.values()
+                and edge[1] in replacements.values()
+            ]
+            if len(cuttable) > 0:
+                added_edges.discard(cuttable[rng.integers(len(cuttable))])
+
+        removed_nodes = np.array(sorted(region), dtype=np.int64)
+        added_nodes = np.array(sorted(replacements.values()), dtype=np.int64)
+        removed_edges = np.array(sorted(removed_edges), dtype=np.int64).reshape(-1, 2)
+        added_edges = np.array(sorted(added_edges), dtype=np.int64).reshape(-1, 2)
+        delta = NetworkDelta(
+            removed_nodes,
+            added_nodes,
+            removed_edges,
+            added_edges,
+            metadata={"operation_id": operation_id, "is_merge": is_merge},
+        )
+
+        graph.remove_nodes_from(removed_nodes.tolist())
+        graph.add_nodes_from(added_nodes.tolist())
+        graph.add_edges_from(added_edges.tolist())
+        for node in region:
+            fragment = pool_index[node][0] and not is_merge
+            pool_remove(node)
+            pool_add(replacements[node], fragment)
+
+        edits[operation_id] = delta
+    return edits
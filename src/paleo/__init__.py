@@ -9,8 +9,19 @@ from .graph_edits import (  # noqa: I001
     get_metaedit_counts,
     check_graph_changes,
 )
+from .cache import Level2Cache, get_level2_cache, set_level2_cache
+from .csrgraph import CSRGraph
+from .deltatable import DeltaTable
 from .level2_graph import get_initial_graph, get_level2_data, get_level2_spatial_graphs
-from .networkdelta import NetworkDelta
+from .networkdelta import NetworkDelta, compose_deltas
+from .parallel import (
+    PartialResultError,
+    get_executor,
+    get_max_in_flight,
+    set_executor,
+    set_max_in_flight,
+)
+from .scheduler import RequestScheduler, get_request_scheduler, set_request_scheduler
 from .utils import (
     get_node_aliases,
     get_component_masks,
@@ -20,9 +31,18 @@ from .utils import (
     get_changed_nodes,
     get_used_node_ids,
 )
-from .replay import apply_edit, resolve_edit, find_anchor_node, apply_edit_sequence
+from .replay import (
+    ComponentTracker,
+    StateHistory,
+    apply_edit,
+    resolve_edit,
+    find_anchor_node,
+    apply_edit_sequence,
+    iter_edit_sequence,
+)
 from .synapses import get_mutable_synapses, map_synapses_to_sequence
 from .skeletons import skeletonize_sequence, compare_skeletons, check_skeleton_changes
+from .store import DeltaStore
 
 __all__ = [
     "compare_graphs",
@@ -32,9 +52,24 @@ __all__ = [
     "get_operation_level2_edit",
     "get_operations_level2_edits",
     "get_root_level2_edits",
+    "DeltaStore",
     "get_initial_graph",
     "apply_edit",
     "NetworkDelta",
+    "compose_deltas",
+    "DeltaTable",
+    "CSRGraph",
+    "Level2Cache",
+    "set_level2_cache",
+    "get_level2_cache",
+    "set_max_in_flight",
+    "get_max_in_flight",
+    "set_executor",
+    "get_executor",
+    "PartialResultError",
+    "RequestScheduler",
+    "set_request_scheduler",
+    "get_request_scheduler",
     "get_node_aliases",
     "get_component_masks",
     "get_initial_network",
@@ -48,6 +83,9 @@ __all__ = [
     "get_changed_nodes",
     "get_used_node_ids",
     "apply_edit_sequence",
+    "iter_edit_sequence",
+    "ComponentTracker",
+    "StateHistory",
     "map_synapses_to_sequence",
     "skeletonize_sequence",
     "compare_skeletons",
@@ -0,0 +1,232 @@
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from .types import Integer
+
+_LEVEL2_CACHE = None
+
+
+class Level2Cache:
+    def __init__(self, path: Union[str, Path], max_bytes: Optional[int] = 2**30 * 10):
+        """
+        An on-disk cache of level2 graphs fetched from the chunkedgraph.
+
+        A root ID is immutable, so the level2 graph for a given root ID and bounding box
+        never changes and can be cached indefinitely. Each entry is stored as a single
+        binary array holding the number of nodes, the node IDs and the flattened edge
+        list. When the cache grows past `max_bytes`, the least recently used entries
+        are evicted.
+
+        The cache only stores a path and size limit, so it can be sent to worker
+        processes; entries are written atomically, so several processes can share one
+        cache directory. Within a process, threads share the running total of its size
+        under a lock. An entry which cannot be read, such as one truncated by a crash,
+        is treated as missing and removed.
+
+        Parameters
+        ----------
+        path :
+            Directory to store the cache in. Created if it does not exist.
+        max_bytes :
+            Maximum total size of the cache on disk, in bytes. If None, the cache is
+            never evicted.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._nbytes = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Level2Cache(path={str(self.path)!r}, max_bytes={self.max_bytes})"
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_nbytes"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _entry_path(
+        self, datastack: Optional[str], root_id: Integer, bounds: Optional[np.ndarray]
+    ) -> Path:
+        if bounds is None:
+            bounds_key = "all"
+        else:
+            bounds_key = np.asarray(bounds, dtype=np.int64).tobytes()
+            bounds_key = hashlib.sha1(bounds_key).hexdigest()[:16]
+        datastack = datastack if datastack is not None else "default"
+        return self.path / datastack / f"{int(root_id)}_{bounds_key}.npy"
+
+    def _iter_entries(self):
+        for datastack_dir in os.scandir(self.path):
+            if not datastack_dir.is_dir():
+                continue
+            for entry in os.scandir(datastack_dir.path):
+                if entry.name.endswith(".npy"):
+                    yield entry
+
+    @property
+    def nbytes(self) -> int:
+        """The total size of the cache on disk, in bytes."""
+        return sum(entry.stat().st_size for entry in self._iter_entries())
+
+    def __len__(self):
+        return sum(1 for _ in self._iter_entries())
+
+    def get(
+        self,
+        datastack: Optional[str],
+        root_id: Integer,
+        bounds: Optional[np.ndarray] = None,
+    ) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """Get the cached nodes and edges for a root ID and bounding box, or None if
+        they are not in the cache."""
+        entry_path = self._entry_path(datastack, root_id, bounds)
+        try:
+            data = np.load(entry_path)
+        except FileNotFoundError:
+            return None
+        except (ValueError, EOFError, OSError):
+            self._remove_entry(entry_path)
+            return None
+        # entries written before node IDs were unsigned hold int64
+        data = data.astype(np.uint64, copy=False)
+        if data.ndim != 1 or len(data) == 0:
+            self._remove_entry(entry_path)
+            return None
+        n_nodes = int(data[0])
+        if n_nodes > len(data) - 1 or (len(data) - 1 - n_nodes) % 2 != 0:
+            self._remove_entry(entry_path)
+            return None
+        # mark as recently used
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+        nodes = data[1 : n_nodes + 1]
+        edges = data[n_nodes + 1 :].reshape(-1, 2)
+        return nodes, edges
+
+    def _remove_entry(self, entry_path: Path) -> None:
+        # a malformed entry is counted in `_nbytes`, so take it off the total
+        try:
+            size = entry_path.stat().st_size
+            os.remove(entry_path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._nbytes is not None:
+                self._nbytes -= size
+
+    def put(
+        self,
+        datastack: Optional[str],
+        root_id: Integer,
+        bounds: Optional[np.ndarray],
+        nodes: np.ndarray,
+        edges: np.ndarray,
+    ) -> None:
+        """Store the nodes and edges for a root ID and bounding box."""
+        entry_path = self._entry_path(datastack, root_id, bounds)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        data = np.concatenate(
+            (
+                np.array([len(nodes)], dtype=np.uint64),
+                np.asarray(nodes, dtype=np.uint64),
+                np.asarray(edges, dtype=np.uint64).ravel(),
+            )
+        )
+        with tempfile.NamedTemporaryFile(
+            dir=entry_path.parent, suffix=".tmp", delete=False
+        ) as f:
+            np.save(f, data)
+        if self.max_bytes is None:
+            os.replace(f.name, entry_path)
+            return
+
+        # the entry is moved into place and counted under the lock, so that another
+        # thread cannot evict it in between
+        size = os.path.getsize(f.name)
+        with self._lock:
+            os.replace(f.name, entry_path)
+            if self._nbytes is None:
+                self._nbytes = self.nbytes
+            else:
+                self._nbytes += size
+            if self._nbytes > self.max_bytes:
+                self._evict(int(0.9 * self.max_bytes))
+
+    def evict(self, target_bytes: Optional[int] = None) -> None:
+        """Remove least recently used entries until the cache is at most `target_bytes`
+        in size, by default 90% of `max_bytes`."""
+        if target_bytes is None:
+            if self.max_bytes is None:
+                return
+            target_bytes = int(0.9 * self.max_bytes)
+        with self._lock:
+            self._evict(target_bytes)
+
+    def _evict(self, target_bytes: int) -> None:
+        # must be called with the lock held
+        entries = []
+        for entry in self._iter_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if nbytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            nbytes -= size
+        self._nbytes = nbytes
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self.evict(target_bytes=0)
+
+
+def set_level2_cache(
+    cache: Union[Level2Cache, str, Path, None], max_bytes: Optional[int] = 2**30 * 10
+) -> Optional[Level2Cache]:
+    """Set the cache used for level2 graph fetches throughout paleo.
+
+    Parameters
+    ----------
+    cache :
+        A `Level2Cache`, or a path to create one at. If None, caching is turned off.
+    max_bytes :
+        Maximum size of the cache in bytes, if a path is given.
+
+    Returns
+    -------
+    :
+        The cache that was set.
+    """
+    global _LEVEL2_CACHE
+    if isinstance(cache, (str, Path)):
+        cache = Level2Cache(cache, max_bytes=max_bytes)
+    _LEVEL2_CACHE = cache
+    return cache
+
+
+def get_level2_cache() -> Optional[Level2Cache]:
+    """Get the cache set by `set_level2_cache`, or None if caching is off."""
+    return _LEVEL2_CACHE
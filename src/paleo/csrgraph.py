@@ -0,0 +1,569 @@
+from collections import deque
+from typing import Collection, Hashable, Iterable, Iterator, Optional
+
+import networkx as nx
+import numpy as np
+
+
+class CSRGraph:
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+    ):
+        """
+        A compact, integer-indexed undirected graph.
+
+        Nodes are stored as a sorted array of node IDs, and adjacency is stored in
+        compressed sparse row (CSR) format over positions in that array, with each
+        edge stored in both directions. This uses a small fraction of the memory of a
+        `networkx.Graph` of the same size.
+
+        The graph can still be edited: removed nodes and edges are marked with
+        tombstones rather than deleted, and added nodes and edges are kept in a small
+        overflow area. `copy` and `compact` rebuild a clean CSR structure. Self-loops
+        are not supported.
+
+        The methods used to replay edits (`has_node`, `has_edge`, `neighbors`,
+        `add_nodes_from`, `add_edges_from`, `remove_nodes_from`, `remove_edges_from`)
+        follow the `networkx` API, so `apply_edit`, `resolve_edit` and
+        `apply_edit_sequence` accept a `CSRGraph` directly. Use `to_networkx` to
+        convert when needed.
+
+        Usually created with `CSRGraph.from_arrays` or `CSRGraph.from_networkx`.
+
+        Parameters
+        ----------
+        node_ids :
+            Sorted, unique array of node IDs.
+        indptr :
+            CSR index pointer array, of length `len(node_ids) + 1`.
+        indices :
+            CSR column indices, giving positions of neighbors in `node_ids`.
+        """
+        self._node_ids = node_ids
+        self._indptr = indptr
+        self._indices = indices
+        self._node_alive = np.ones(len(node_ids), dtype=bool)
+        self._entry_alive = np.ones(len(indices), dtype=bool)
+        self._n_dead_by_row = np.zeros(len(node_ids), dtype=np.int32)
+        self._n_removed_nodes = 0
+
+        # overflow area for nodes and edges added after construction, indexed by
+        # positions continuing on from the end of `node_ids`
+        self._extra_positions = {}
+        self._extra_ids = []
+        self._extra_id_array = np.empty(0, dtype=node_ids.dtype)
+        self._extra_adjacency = {}
+
+        # labels for each position, used by searches and reset to -1 after each one,
+        # so that a search costs in proportion to what it visits
+        self._labels = None
+
+    @classmethod
+    def from_arrays(cls, nodes: np.ndarray, edges: np.ndarray) -> "CSRGraph":
+        """Create a graph from an array of node IDs and an (n_edges, 2) array of
+        edges. Nodes which only appear in `edges` are also added."""
+        nodes = np.asarray(nodes)
+        edges = np.asarray(edges).reshape(-1, 2)
+        if len(nodes) > 0 and len(edges) > 0:
+            edges = edges.astype(nodes.dtype, copy=False)
+        node_ids = np.unique(np.concatenate((nodes, edges.ravel())))
+        if not np.issubdtype(node_ids.dtype, np.integer):
+            node_ids = node_ids.astype(np.uint64)
+            edges = edges.astype(np.uint64)
+
+        # drop duplicate edges in either orientation
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        sources = np.searchsorted(node_ids, edges[:, 0])
+        targets = np.searchsorted(node_ids, edges[:, 1])
+        rows = np.concatenate((sources, targets))
+        cols = np.concatenate((targets, sources))
+
+        n_nodes = len(node_ids)
+        index_dtype = np.int32 if n_nodes < np.iinfo(np.int32).max else np.int64
+        order = np.lexsort((cols, rows))
+        indices = cols[order].astype(index_dtype)
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+        return cls(node_ids, indptr, indices)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph) -> "CSRGraph":
+        """Create a graph from a `networkx.Graph` with integer node IDs."""
+        nodes = np.array(list(graph.nodes()))
+        edges = np.array(list(graph.edges())).reshape(-1, 2)
+        return cls.from_arrays(nodes, edges)
+
+    def to_networkx(self) -> nx.Graph:
+        """Convert to a `networkx.Graph`."""
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes())
+        graph.add_edges_from(self.edges())
+        return graph
+
+    def __repr__(self):
+        return (
+            f"CSRGraph(n_nodes={self.number_of_nodes()}, "
+            f"n_edges={self.number_of_edges()}, nbytes={self.nbytes})"
+        )
+
+    def __len__(self):
+        return self.number_of_nodes()
+
+    def __contains__(self, node: Hashable) -> bool:
+        return self.has_node(node)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.nodes())
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the arrays of this graph, not counting the
+        overflow area."""
+        return (
+            self._node_ids.nbytes
+            + self._indptr.nbytes
+            + self._indices.nbytes
+            + self._node_alive.nbytes
+            + self._entry_alive.nbytes
+            + self._n_dead_by_row.nbytes
+        )
+
+    @property
+    def n_overflow(self) -> int:
+        """The number of nodes and edges held in the overflow area or marked as
+        removed since this graph was last compacted."""
+        n_extra_edges = sum(len(adj) for adj in self._extra_adjacency.values()) // 2
+        n_dead_entries = len(self._entry_alive) - np.count_nonzero(self._entry_alive)
+        return (
+            len(self._extra_ids)
+            + n_extra_edges
+            + self._n_removed_nodes
+            + n_dead_entries // 2
+        )
+
+    # ---------------------------------------------------------------------------------
+    # lookups
+
+    def _position(self, node: Hashable) -> Optional[int]:
+        node_ids = self._node_ids
+        try:
+            # mixing signed and unsigned integers would compare as floats
+            key = node_ids.dtype.type(node)
+            position = int(node_ids.searchsorted(key))
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if position < len(node_ids) and node_ids[position] == key:
+            if self._node_alive[position]:
+                return position
+            return None
+        return self._extra_positions.get(node)
+
+    def _ids_of(self, positions: np.ndarray) -> np.ndarray:
+        positions = np.asarray(positions, dtype=np.int64)
+        shape = positions.shape
+        positions = positions.ravel()
+        n_base = len(self._node_ids)
+        is_base = positions < n_base
+        if np.all(is_base):
+            return self._node_ids[positions].reshape(shape)
+        if len(self._extra_id_array) != len(self._extra_ids):
+            self._extra_id_array = np.array(self._extra_ids, dtype=self._node_ids.dtype)
+        ids = np.empty(len(positions), dtype=self._node_ids.dtype)
+        ids[is_base] = self._node_ids[positions[is_base]]
+        ids[~is_base] = self._extra_id_array[positions[~is_base] - n_base]
+        return ids.reshape(shape)
+
+    def _row(self, position: int) -> tuple[int, int]:
+        return self._indptr[position], self._indptr[position + 1]
+
+    def _entry(self, position: int, other: int) -> Optional[int]:
+        # index into `indices` of the CSR entry from `position` to `other`, if any
+        if position >= len(self._node_ids) or other >= len(self._node_ids):
+            return None
+        start, stop = self._row(position)
+        offset = int(np.searchsorted(self._indices[start:stop], other))
+        if start + offset < stop and self._indices[start + offset] == other:
+            return start + offset
+        return None
+
+    def _positions_of(self, nodes: Collection[Hashable]) -> np.ndarray:
+        # positions of the nodes which are in the graph, skipping any which are not
+        node_ids = self._node_ids
+        keys = np.fromiter(nodes, dtype=node_ids.dtype, count=len(nodes))
+        positions = np.searchsorted(node_ids, keys)
+        if len(node_ids) > 0:
+            clipped = np.minimum(positions, len(node_ids) - 1)
+            is_found = node_ids[clipped] == keys
+        else:
+            clipped = positions
+            is_found = np.zeros(len(keys), dtype=bool)
+        is_base = is_found & self._node_alive[clipped]
+        positions = positions[is_base].astype(np.int64)
+        if len(self._extra_positions) > 0:
+            extra = [
+                self._extra_positions[key]
+                for key in keys[~is_found].tolist()
+                if key in self._extra_positions
+            ]
+            if len(extra) > 0:
+                positions = np.concatenate((positions, np.array(extra, dtype=np.int64)))
+        return positions
+
+    def _incident_positions(
+        self, positions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # the (position, neighbor position) pairs of every edge at `positions`
+        positions = np.asarray(positions, dtype=np.int64)
+        base = positions[positions < len(self._node_ids)]
+        starts = self._indptr[base]
+        lengths = self._indptr[base + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        entries = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+        is_alive = self._entry_alive[entries]
+        sources = np.repeat(base, lengths)[is_alive]
+        targets = self._indices[entries[is_alive]].astype(np.int64)
+        if len(self._extra_adjacency) > 0:
+            extra = [
+                (position, other)
+                for position in positions.tolist()
+                for other in self._extra_adjacency.get(position, ())
+            ]
+            if len(extra) > 0:
+                extra = np.array(extra, dtype=np.int64)
+                sources = np.concatenate((sources, extra[:, 0]))
+                targets = np.concatenate((targets, extra[:, 1]))
+        return sources, targets
+
+    def _get_labels(self) -> np.ndarray:
+        n_positions = len(self._node_ids) + len(self._extra_ids)
+        if self._labels is None or len(self._labels) < n_positions:
+            # leave room for nodes added later, so that growing is rare
+            size = n_positions + n_positions // 4 + 16
+            self._labels = np.full(size, -1, dtype=np.int32)
+        return self._labels
+
+    def _neighbor_positions(self, position: int) -> np.ndarray:
+        if position < len(self._node_ids):
+            start, stop = self._row(position)
+            neighbors = self._indices[start:stop][self._entry_alive[start:stop]]
+        else:
+            neighbors = np.empty(0, dtype=np.int64)
+        extra = self._extra_adjacency.get(position)
+        if extra:
+            neighbors = np.concatenate(
+                (neighbors, np.fromiter(extra, dtype=np.int64, count=len(extra)))
+            )
+        return neighbors
+
+    def has_node(self, node: Hashable) -> bool:
+        """Whether `node` is in the graph."""
+        return self._position(node) is not None
+
+    def has_edge(self, source: Hashable, target: Hashable) -> bool:
+        """Whether the edge between `source` and `target` is in the graph."""
+        source_position = self._position(source)
+        target_position = self._position(target)
+        if source_position is None or target_position is None:
+            return False
+        entry = self._entry(source_position, target_position)
+        if entry is not None and self._entry_alive[entry]:
+            return True
+        return target_position in self._extra_adjacency.get(source_position, ())
+
+    def neighbors(self, node: Hashable) -> list:
+        """The IDs of the neighbors of `node`."""
+        position = self._position(node)
+        if position is None:
+            raise nx.NetworkXError(f"The node {node} is not in the graph.")
+        if position < len(self._node_ids):
+            start = self._indptr[position]
+            stop = self._indptr[position + 1]
+            row = self._indices[start:stop]
+            if self._n_dead_by_row[position] > 0:
+                row = row[self._entry_alive[start:stop]]
+            neighbors = self._node_ids[row].tolist()
+        else:
+            neighbors = []
+        extra = self._extra_adjacency.get(position)
+        if extra:
+            neighbors.extend(self._ids_of(list(extra)).tolist())
+        return neighbors
+
+    def number_of_nodes(self) -> int:
+        """The number of nodes in the graph."""
+        return len(self._node_ids) - self._n_removed_nodes + len(self._extra_positions)
+
+    def number_of_edges(self) -> int:
+        """The number of edges in the graph."""
+        return len(self.edges())
+
+    def nodes(self) -> np.ndarray:
+        """The IDs of all nodes in the graph."""
+        nodes = self._node_ids[self._node_alive]
+        if len(self._extra_positions) > 0:
+            extra_ids = np.array(list(self._extra_positions), dtype=nodes.dtype)
+            nodes = np.concatenate((nodes, extra_ids))
+        return nodes
+
+    def _edge_positions(self) -> np.ndarray:
+        rows = np.repeat(
+            np.arange(len(self._node_ids), dtype=np.int64), np.diff(self._indptr)
+        )
+        cols = self._indices.astype(np.int64)
+        mask = self._entry_alive & (rows < cols)
+        edges = np.stack((rows[mask], cols[mask]), axis=1)
+        extra_edges = [
+            (position, other)
+            for position, adjacency in self._extra_adjacency.items()
+            for other in adjacency
+            if position < other
+        ]
+        if len(extra_edges) > 0:
+            edges = np.concatenate((edges, np.array(extra_edges, dtype=np.int64)))
+        return edges
+
+    def edges(self) -> np.ndarray:
+        """The edges of the graph, as an (n_edges, 2) array of node IDs."""
+        return self._ids_of(self._edge_positions()).reshape(-1, 2)
+
+    # ---------------------------------------------------------------------------------
+    # edits
+
+    def add_nodes_from(self, nodes: Iterable[Hashable]) -> None:
+        """Add nodes to the graph. Nodes which are already in the graph are ignored."""
+        for node in nodes:
+            self._add_node(node)
+
+    def _add_node(self, node: Hashable) -> int:
+        key = self._node_ids.dtype.type(node)
+        position = int(np.searchsorted(self._node_ids, key))
+        if position < len(self._node_ids) and self._node_ids[position] == key:
+            if not self._node_alive[position]:
+                self._node_alive[position] = True
+                self._n_removed_nodes -= 1
+            return position
+        node = int(node)
+        position = self._extra_positions.get(node)
+        if position is None:
+            position = len(self._node_ids) + len(self._extra_ids)
+            self._extra_positions[node] = position
+            self._extra_ids.append(node)
+        return position
+
+    def add_edges_from(self, edges: Iterable[tuple[Hashable, Hashable]]) -> None:
+        """Add edges to the graph, adding their nodes if needed."""
+        for source, target in edges:
+            source_position = self._add_node(source)
+            target_position = self._add_node(target)
+            entry = self._entry(source_position, target_position)
+            if entry is not None:
+                self._set_entry_alive(source_position, target_position, True)
+            else:
+                self._extra_adjacency.setdefault(source_position, set()).add(
+                    target_position
+                )
+                self._extra_adjacency.setdefault(target_position, set()).add(
+                    source_position
+                )
+
+    def remove_nodes_from(self, nodes: Iterable[Hashable]) -> None:
+        """Remove nodes and their edges. Nodes not in the graph are ignored."""
+        for node in nodes:
+            position = self._position(node)
+            if position is None:
+                continue
+            for other in self._neighbor_positions(position):
+                self._remove_edge_positions(position, int(other))
+            if position < len(self._node_ids):
+                self._node_alive[position] = False
+                self._n_removed_nodes += 1
+            else:
+                del self._extra_positions[int(node)]
+                self._extra_adjacency.pop(position, None)
+
+    def remove_edges_from(self, edges: Iterable[tuple[Hashable, Hashable]]) -> None:
+        """Remove edges. Edges not in the graph are ignored."""
+        for source, target in edges:
+            source_position = self._position(source)
+            target_position = self._position(target)
+            if source_position is None or target_position is None:
+                continue
+            self._remove_edge_positions(source_position, target_position)
+
+    def _set_entry_alive(self, position: int, other: int, alive: bool) -> None:
+        # mark the CSR entries for an edge in both directions, if they exist
+        for first, second in ((position, other), (other, position)):
+            entry = self._entry(first, second)
+            if entry is None:
+                return
+            if self._entry_alive[entry] != alive:
+                self._entry_alive[entry] = alive
+                self._n_dead_by_row[first] += -1 if alive else 1
+
+    def _remove_edge_positions(self, position: int, other: int) -> None:
+        self._set_entry_alive(position, other, False)
+        for first, second in ((position, other), (other, position)):
+            adjacency = self._extra_adjacency.get(first)
+            if adjacency is not None:
+                adjacency.discard(second)
+                if len(adjacency) == 0:
+                    del self._extra_adjacency[first]
+
+    # ---------------------------------------------------------------------------------
+    # whole-graph operations
+
+    def copy(self) -> "CSRGraph":
+        """Return a compacted copy of the graph."""
+        return CSRGraph.from_arrays(self.nodes(), self.edges())
+
+    def compact(self) -> None:
+        """Rebuild the CSR structure in place, folding in the overflow area and
+        dropping anything marked as removed."""
+        compacted = self.copy()
+        self.__dict__.update(compacted.__dict__)
+
+    def subgraph(self, nodes: Collection[Hashable]) -> "CSRGraph":
+        """Return a new graph induced on `nodes`. Only the rows of `nodes` are read,
+        and nodes which are not in the graph are ignored."""
+        positions = np.unique(self._positions_of(nodes))
+        labels = self._get_labels()
+        labels[positions] = 0
+        try:
+            sources, targets = self._incident_positions(positions)
+            is_inside = labels[targets] == 0
+        finally:
+            labels[positions] = -1
+        mask = is_inside & (sources < targets)
+        edges = self._ids_of(np.stack((sources[mask], targets[mask]), axis=1))
+        return CSRGraph.from_arrays(self._ids_of(positions), edges.reshape(-1, 2))
+
+    def node_connected_component(self, node: Hashable) -> set:
+        """Return the set of nodes in the connected component containing `node`."""
+        position = self._position(node)
+        if position is None:
+            raise KeyError(node)
+        labels = self._get_labels()
+        frontier = np.array([position], dtype=np.int64)
+        labels[frontier] = 0
+        visited = [frontier]
+        try:
+            # breadth-first search, a whole level at a time
+            while len(frontier) > 0:
+                neighbors = self._incident_positions(frontier)[1]
+                frontier = np.unique(neighbors[labels[neighbors] == -1])
+                labels[frontier] = 0
+                visited.append(frontier)
+        finally:
+            visited = np.concatenate(visited)
+            labels[visited] = -1
+        return set(self._ids_of(visited).tolist())
+
+    def separate_components(
+        self, starts: Collection[Hashable]
+    ) -> tuple[list[set], set]:
+        """Search outward from each of `starts` in lockstep until at most one search
+        is still growing, as `paleo.replay` does to find pieces cut off by an edit.
+
+        Searches which reach each other are merged. The searches run over positions,
+        reading rows straight from the CSR arrays, so each node visited costs about
+        as much as a dictionary lookup in a `networkx.Graph`.
+
+        Returns
+        -------
+        :
+            The node sets of the searches which ran out of nodes, each of which is an
+            entire connected component.
+        :
+            The nodes visited by the search which was still growing, if any.
+        """
+        labels = self._get_labels()
+        # memoryviews give fast scalar access to the arrays
+        label_view = memoryview(labels)
+        indptr = memoryview(self._indptr)
+        indices = memoryview(self._indices)
+        n_dead_by_row = memoryview(self._n_dead_by_row)
+        n_base = len(self._node_ids)
+        extra_adjacency = self._extra_adjacency
+
+        parents = {}
+        queues = {}
+        members = {}
+        pieces = []
+
+        def find(search_id):
+            root = search_id
+            while parents[root] != root:
+                root = parents[root]
+            while parents[search_id] != root:
+                parents[search_id], search_id = root, parents[search_id]
+            return root
+
+        def merge(search_id, other_id):
+            if len(members[search_id]) < len(members[other_id]):
+                search_id, other_id = other_id, search_id
+            parents[other_id] = search_id
+            queues[search_id].extend(queues.pop(other_id))
+            members[search_id].extend(members.pop(other_id))
+            active.discard(other_id)
+            return search_id
+
+        try:
+            for search_id, start in enumerate(starts):
+                position = self._position(start)
+                if position is None:
+                    raise nx.NetworkXError(f"The node {start} is not in the graph.")
+                label_view[position] = search_id
+                parents[search_id] = search_id
+                queues[search_id] = deque([position])
+                members[search_id] = [position]
+
+            active = set(queues.keys())
+            while len(active) > 1:
+                for search_id in list(active):
+                    if search_id not in active:
+                        continue
+                    queue = queues[search_id]
+                    if len(queue) == 0:
+                        active.remove(search_id)
+                        del queues[search_id]
+                        pieces.append(members.pop(search_id))
+                        continue
+                    position = queue.popleft()
+                    if position < n_base and n_dead_by_row[position] == 0:
+                        row = indices[indptr[position] : indptr[position + 1]].tolist()
+                        extra = extra_adjacency.get(position)
+                        if extra:
+                            row.extend(extra)
+                    else:
+                        row = self._neighbor_positions(position).tolist()
+                    visited = members[search_id]
+                    for neighbor in row:
+                        other_id = label_view[neighbor]
+                        if other_id == -1:
+                            label_view[neighbor] = search_id
+                            queue.append(neighbor)
+                            visited.append(neighbor)
+                        elif other_id != search_id:
+                            other_id = find(other_id)
+                            if other_id != search_id:
+                                search_id = merge(search_id, other_id)
+                                queue = queues[search_id]
+                                visited = members[search_id]
+        finally:
+            for visited in [*members.values(), *pieces]:
+                labels[visited] = -1
+
+        def _as_set(positions):
+            return set(self._ids_of(positions).tolist())
+
+        remaining = _as_set(members.popitem()[1]) if len(members) > 0 else set()
+        return [_as_set(piece) for piece in pieces], remaining
+
+
+def _as_networkx(graph) -> nx.Graph:
+    if isinstance(graph, CSRGraph):
+        return graph.to_networkx()
+    return graph
@@ -0,0 +1,248 @@
+import json
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import numpy as np
+
+from .networkdelta import (
+    NODE_DTYPE,
+    OPERATION_ID_DTYPE,
+    NetworkDelta,
+    _json_default,
+    _net_changes,
+)
+from .types import Integer
+
+DELTA_FIELDS = ("removed_nodes", "added_nodes", "removed_edges", "added_edges")
+
+METADATA_FILE = "metadata.json"
+
+
+class DeltaTable(Mapping):
+    def __init__(
+        self,
+        operation_ids: np.ndarray,
+        arrays: dict[str, np.ndarray],
+        offsets: dict[str, np.ndarray],
+        metadata: Optional[list[dict]] = None,
+    ):
+        """
+        A compact, read-only table of the edits from many operations.
+
+        Rather than four small arrays per operation, the removed nodes, added nodes,
+        removed edges and added edges of every operation are each held in one
+        contiguous array, with an array of offsets marking where each operation's rows
+        start. A history of many operations then takes a handful of arrays, which can
+        be saved with `save` and memory-mapped from disk with `DeltaTable.load`.
+
+        The table is a mapping from operation ID to `NetworkDelta`, so it can be passed
+        anywhere a dictionary of edits is accepted. Each `NetworkDelta` is created when
+        it is accessed, and its arrays are views into the table. Bulk methods such as
+        `changed_nodes` and `touched_nodes` work on the flat arrays directly.
+
+        Usually created with `DeltaTable.from_deltas` or `DeltaTable.load`.
+
+        Parameters
+        ----------
+        operation_ids :
+            The operation IDs, in order.
+        arrays :
+            The concatenated arrays of each of "removed_nodes", "added_nodes",
+            "removed_edges" and "added_edges"; edge arrays have two columns.
+        offsets :
+            For each of the same keys, an array of length `len(operation_ids) + 1`
+            such that the rows of operation `i` are `offsets[i]:offsets[i + 1]`.
+        metadata :
+            The metadata of each operation, or None if there is none.
+        """
+        self.operation_ids = operation_ids
+        self._arrays = arrays
+        self._offsets = offsets
+        self._metadata = metadata
+        self._positions = None
+
+    @classmethod
+    def from_deltas(cls, networkdeltas: dict[Integer, NetworkDelta]) -> "DeltaTable":
+        """Create a table from a dictionary mapping operation IDs to edits."""
+        deltas = list(networkdeltas.values())
+        operation_ids = np.fromiter(
+            networkdeltas.keys(), dtype=OPERATION_ID_DTYPE, count=len(deltas)
+        )
+        arrays = {}
+        offsets = {}
+        for field in DELTA_FIELDS:
+            shape = (-1, 2) if field.endswith("edges") else (-1,)
+            values = [getattr(delta, field).reshape(shape) for delta in deltas]
+            field_offsets = np.zeros(len(deltas) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in values], out=field_offsets[1:])
+            empty = np.empty(0, dtype=NODE_DTYPE).reshape(shape)
+            arrays[field] = np.concatenate([empty] + values)
+            offsets[field] = field_offsets
+        metadata = None
+        if any(delta.has_metadata for delta in deltas):
+            metadata = [delta.metadata for delta in deltas]
+        return cls(operation_ids, arrays, offsets, metadata=metadata)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Save the table to a directory of `.npy` files, which `DeltaTable.load` can
+        memory-map."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "operation_ids.npy", self.operation_ids)
+        for field in DELTA_FIELDS:
+            np.save(path / f"{field}.npy", self._arrays[field])
+            np.save(path / f"{field}_offsets.npy", self._offsets[field])
+        metadata_path = path / METADATA_FILE
+        if self._metadata is not None:
+            with open(metadata_path, "w") as f:
+                json.dump(self._metadata, f, default=_json_default)
+        elif metadata_path.exists():
+            metadata_path.unlink()
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "DeltaTable":
+        """Load a table saved by `save`.
+
+        Parameters
+        ----------
+        path :
+            Directory the table was saved to.
+        mmap :
+            Whether to memory-map the arrays rather than read them into memory, so that
+            only the parts which are used are read from disk.
+        """
+        path = Path(path)
+        mmap_mode = "r" if mmap else None
+        operation_ids = np.load(path / "operation_ids.npy")
+        arrays = {}
+        offsets = {}
+        for field in DELTA_FIELDS:
+            arrays[field] = np.load(path / f"{field}.npy", mmap_mode=mmap_mode)
+            offsets[field] = np.load(path / f"{field}_offsets.npy")
+        metadata = None
+        if (path / METADATA_FILE).exists():
+            with open(path / METADATA_FILE) as f:
+                metadata = json.load(f)
+        return cls(operation_ids, arrays, offsets, metadata=metadata)
+
+    def __repr__(self):
+        return (
+            f"DeltaTable(n_operations={len(self)}, "
+            + ", ".join(
+                f"n_{field}={len(self._arrays[field])}" for field in DELTA_FIELDS
+            )
+            + ")"
+        )
+
+    def __len__(self):
+        return len(self.operation_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.operation_ids.tolist())
+
+    def __contains__(self, operation_id: Integer) -> bool:
+        return operation_id in self._get_positions()
+
+    def __getitem__(self, operation_id: Integer) -> NetworkDelta:
+        position = self._get_positions()[operation_id]
+        fields = {}
+        for field in DELTA_FIELDS:
+            start, stop = self._offsets[field][position : position + 2]
+            fields[field] = self._arrays[field][start:stop]
+        metadata = None if self._metadata is None else self._metadata[position]
+        return NetworkDelta(**fields, metadata=metadata)
+
+    def _get_positions(self) -> dict[int, int]:
+        if self._positions is None:
+            self._positions = {
+                operation_id: position
+                for position, operation_id in enumerate(self.operation_ids.tolist())
+            }
+        return self._positions
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the arrays of this table."""
+        return (
+            self.operation_ids.nbytes
+            + sum(array.nbytes for array in self._arrays.values())
+            + sum(array.nbytes for array in self._offsets.values())
+        )
+
+    def get_array(self, field: str) -> np.ndarray:
+        """Get the concatenated array of one of "removed_nodes", "added_nodes",
+        "removed_edges" or "added_edges" over all operations."""
+        return self._arrays[field]
+
+    def get_row_positions(self, field: str) -> np.ndarray:
+        """Get the position of the operation that each row of `get_array(field)`
+        belongs to."""
+        return np.repeat(
+            np.arange(len(self), dtype=np.int64), np.diff(self._offsets[field])
+        )
+
+    def compose(self, operation_ids: Optional[list[Integer]] = None) -> NetworkDelta:
+        """Compose the edits of the table, in order, into one net edit; see
+        `compose_deltas`.
+
+        Parameters
+        ----------
+        operation_ids :
+            Operations to compose. They are applied in the order they have in the
+            table, not the order given. If None, composes all operations, which gives
+            the change from the state before the first operation to the state after
+            the last.
+        """
+        if operation_ids is not None:
+            positions = self._get_positions()
+            selected = np.zeros(len(self), dtype=bool)
+            selected[[positions[operation_id] for operation_id in operation_ids]] = True
+        fields = {}
+        for field in DELTA_FIELDS:
+            values = self._arrays[field]
+            row_positions = self.get_row_positions(field)
+            if operation_ids is not None:
+                mask = selected[row_positions]
+                values = values[mask]
+                row_positions = row_positions[mask]
+            fields[field] = (np.asarray(values), row_positions)
+        removed_nodes, added_nodes = _net_changes(
+            *fields["removed_nodes"], *fields["added_nodes"]
+        )
+        removed_edges, added_edges = _net_changes(
+            *fields["removed_edges"], *fields["added_edges"]
+        )
+        return NetworkDelta(removed_nodes, added_nodes, removed_edges, added_edges)
+
+    def changed_nodes(self) -> np.ndarray:
+        """The unique nodes which were added or removed by any operation."""
+        return np.unique(
+            np.concatenate(
+                (self._arrays["removed_nodes"], self._arrays["added_nodes"])
+            )
+        )
+
+    def touched_nodes(self) -> tuple[np.ndarray, np.ndarray]:
+        """The nodes which were added or removed, or had an edge added or removed, by
+        each operation.
+
+        Returns
+        -------
+        :
+            The position of the operation for each entry.
+        :
+            The node ID for each entry. A node may appear more than once for the same
+            operation.
+        """
+        positions = []
+        nodes = []
+        for field in DELTA_FIELDS:
+            field_positions = self.get_row_positions(field)
+            field_nodes = self._arrays[field]
+            if field.endswith("edges"):
+                field_positions = np.repeat(field_positions, 2)
+                field_nodes = field_nodes.reshape(-1)
+            positions.append(field_positions)
+            nodes.append(field_nodes)
+        return np.concatenate(positions), np.concatenate(nodes)
@@ -1,11 +1,10 @@
 import warnings
 from datetime import datetime
-from typing import Collection, Optional, Union
+from typing import Collection, Literal, Optional, Union
 
 import networkx as nx
 import numpy as np
 import pandas as pd
-from joblib import Parallel, delayed
 from scipy.sparse import csr_array
 from scipy.sparse.csgraph import connected_components
 from tqdm import TqdmExperimentalWarning
@@ -13,81 +12,102 @@ from tqdm import TqdmExperimentalWarning
 warnings.filterwarnings("ignore", category=TqdmExperimentalWarning)
 
 from caveclient import CAVEclient
-from tqdm.auto import tqdm
-from tqdm_joblib import tqdm_joblib
+from requests.exceptions import HTTPError, Timeout
 
+from .cache import Level2Cache, get_level2_cache
 from .constants import TIMESTAMP_DELTA
-from .networkdelta import NetworkDelta, combine_deltas
+from .csrgraph import _as_networkx
+from .deltatable import DeltaTable
+from .networkdelta import NODE_DTYPE, NetworkDelta, compose_deltas
+from .parallel import ExecutorLike, PartialResultError, parallel_map
+from .scheduler import schedule_client
 from .types import Graph, Integer, Number
-from .utils import _get_level2_nodes_edges, _sort_edgelist
+from .utils import (
+    _crop_level2_nodes_edges,
+    _get_level2_chunk_layout,
+    _get_level2_nodes_edges,
+    _level2_nodes_touch_bounds,
+    _sort_edgelist,
+)
+
+OPERATION_DETAILS_MAX_CHUNK_SIZE = 500
+OPERATION_DETAILS_MAX_QUERY_LENGTH = 15_000
+# statuses which mean the request was too large, so a smaller one might succeed. other
+# failures, such as transient server errors, are retried by the request scheduler
+SPLITTABLE_STATUS_CODES = (413, 414, 431)
+
+ADAPTIVE_START_CHUNKS = 1
+ADAPTIVE_MAX_CHUNKS = 32
+DEFAULT_RADIUS = 20_000
+
+Radius = Union[Number, Literal["adaptive"], None]
 
 
 def _get_changed_edges(
     before_edges: np.ndarray, after_edges: np.ndarray
 ) -> tuple[np.ndarray, np.ndarray]:
-    before_edges = _sort_edgelist(before_edges)
-    after_edges = _sort_edgelist(after_edges)
-
-    before_edges = np.concatenate(
-        (before_edges, np.zeros((before_edges.shape[0], 1), dtype=int)), axis=1
+    before_edges = _sort_edgelist(before_edges.astype(NODE_DTYPE, copy=False))
+    after_edges = _sort_edgelist(after_edges.astype(NODE_DTYPE, copy=False))
+
+    # edges found only once are in one graph but not the other; whether that is the
+    # before or after graph is read off their position, rather than from an extra
+    # label column which would force a signed dtype
+    all_edges = np.concatenate((before_edges, after_edges), axis=0)
+    _, index, edge_counts = np.unique(
+        all_edges, axis=0, return_counts=True, return_index=True
     )
-    after_edges = np.concatenate(
-        (after_edges, np.ones((after_edges.shape[0], 1), dtype=int)), axis=1
-    )
-
-    all_edges = np.concatenate((before_edges, after_edges), axis=0, dtype=int)
-    unique_edges, index, edge_counts = np.unique(
-        all_edges[:, :2], axis=0, return_counts=True, return_index=True
-    )
-
-    single_inverse = index[edge_counts == 1]
-    single_edges = all_edges[single_inverse]
 
-    removed_edges = single_edges[single_edges[:, 2] == 0][:, :2]
-    added_edges = single_edges[single_edges[:, 2] == 1][:, :2]
+    single_index = index[edge_counts == 1]
+    is_before = single_index < len(before_edges)
+    removed_edges = all_edges[single_index[is_before]]
+    added_edges = all_edges[single_index[~is_before]]
 
     return removed_edges, added_edges
 
 
 def _make_bbox(
-    bbox_radius: Number, point_in_seg: np.ndarray, seg_resolution: np.ndarray
+    bbox_radius: Union[Number, np.ndarray],
+    point_in_seg: np.ndarray,
+    seg_resolution: np.ndarray,
 ) -> np.ndarray:
+    # `bbox_radius` can also be given per axis
     point_in_nm = point_in_seg * seg_resolution
-    x_center, y_center, z_center = point_in_nm
 
-    x_start = x_center - bbox_radius
-    x_stop = x_center + bbox_radius
-    y_start = y_center - bbox_radius
-    y_stop = y_center + bbox_radius
-    z_start = z_center - bbox_radius
-    z_stop = z_center + bbox_radius
-
-    start_point_cg = np.array([x_start, y_start, z_start]) / seg_resolution
-    stop_point_cg = np.array([x_stop, y_stop, z_stop]) / seg_resolution
+    start_point_cg = (point_in_nm - bbox_radius) / seg_resolution
+    stop_point_cg = (point_in_nm + bbox_radius) / seg_resolution
 
     bbox_cg = np.array([start_point_cg, stop_point_cg], dtype=int)
     return bbox_cg
 
 
 def _get_all_nodes_edges(
-    root_ids: Number, client: CAVEclient, bounds: Optional[np.ndarray] = None
+    root_ids: Number,
+    client: CAVEclient,
+    bounds: Optional[np.ndarray] = None,
+    cache: Optional[Level2Cache] = None,
 ) -> tuple[np.ndarray, np.ndarray]:
     all_nodes = []
     all_edges = []
     for root_id in root_ids:
-        nodes, edges = _get_level2_nodes_edges(root_id, client, bounds=bounds)
+        nodes, edges = _get_level2_nodes_edges(
+            root_id, client, bounds=bounds, cache=cache
+        )
         all_nodes.append(nodes)
         all_edges.append(edges)
     if len(all_nodes) == 0:
-        return np.empty(0, dtype=int), np.empty((0, 2), dtype=int)
+        return np.empty(0, dtype=NODE_DTYPE), np.empty((0, 2), dtype=NODE_DTYPE)
     else:
-        all_nodes = np.concatenate(all_nodes, dtype=int)
-        all_edges = np.concatenate(all_edges, dtype=int)
+        all_nodes = np.concatenate(all_nodes, dtype=NODE_DTYPE)
+        all_edges = np.concatenate(all_edges, dtype=NODE_DTYPE)
         return all_nodes, all_edges
 
 
 def get_detailed_change_log(
-    root_id: int, client: CAVEclient, filtered: bool = True
+    root_id: int,
+    client: CAVEclient,
+    filtered: bool = True,
+    n_jobs: int = -1,
+    executor: ExecutorLike = None,
 ) -> pd.DataFrame:
     """Get a detailed change log for a root ID.
 
@@ -100,43 +120,135 @@ def get_detailed_change_log(
     filtered :
         Whether to filter the change log to only include changes which affect the
         final state of the root ID.
+    n_jobs :
+        The number of requests for operation details to run concurrently. If -1, uses
+        the limit set by `set_max_in_flight`.
+    executor :
+        How to run requests in parallel; see `set_executor`.
 
     Returns
     -------
     :
         A detailed change log for the root ID.
     """
+    client = schedule_client(client)
+    change_log = _get_tabular_change_log(root_id, client, filtered=filtered)
+    return _join_operation_details(change_log, client, n_jobs=n_jobs, executor=executor)
+
+
+def _get_tabular_change_log(
+    root_id: int, client: CAVEclient, filtered: bool = True
+) -> pd.DataFrame:
     cg = client.chunkedgraph
     change_log = cg.get_tabular_change_log(root_id, filtered=filtered)[root_id]
 
     change_log.set_index("operation_id", inplace=True)
     change_log.sort_values("timestamp", inplace=True)
     change_log.drop(columns=["timestamp"], inplace=True)
+    return change_log
+
+
+def _chunk_operation_ids(
+    operation_ids: list[int],
+    max_chunk_size: int = OPERATION_DETAILS_MAX_CHUNK_SIZE,
+    max_query_length: int = OPERATION_DETAILS_MAX_QUERY_LENGTH,
+) -> list[list[int]]:
+    # operation IDs are sent in the query string, so a chunk is limited by the length
+    # of the URL as well as by its number of IDs
+    chunks = []
+    chunk = []
+    query_length = 0
+    for operation_id in operation_ids:
+        id_length = len(str(operation_id)) + len("&operation_ids=")
+        if len(chunk) > 0 and (
+            len(chunk) >= max_chunk_size or query_length + id_length > max_query_length
+        ):
+            chunks.append(chunk)
+            chunk = []
+            query_length = 0
+        chunk.append(operation_id)
+        query_length += id_length
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks
+
+
+def _get_operation_details(operation_ids: list[int], client: CAVEclient) -> dict:
+    """Get the details of some operations, splitting the request in half whenever the
+    server rejects it as too large or it times out."""
+    try:
+        return client.chunkedgraph.get_operation_details(operation_ids)
+    except (HTTPError, Timeout) as error:
+        status_code = getattr(error.response, "status_code", None)
+        is_too_large = status_code in SPLITTABLE_STATUS_CODES
+        if len(operation_ids) == 1 or not (is_too_large or isinstance(error, Timeout)):
+            raise
+    half = len(operation_ids) // 2
+    details = _get_operation_details(operation_ids[:half], client)
+    details.update(_get_operation_details(operation_ids[half:], client))
+    return details
+
+
+def _details_to_frame(details: dict, operation_ids: list[int]) -> pd.DataFrame:
+    # build each column as a list and let pandas infer its type, which is much faster
+    # than transposing a frame of dicts and avoids leaving every column as objects
+    details = {int(operation_id): value for operation_id, value in details.items()}
+    columns = {}
+    for operation_details in details.values():
+        for key in operation_details:
+            columns.setdefault(key, None)
+    columns = {
+        key: [details[operation_id].get(key) for operation_id in operation_ids]
+        for key in columns
+    }
+    index = pd.Index(operation_ids, dtype=int, name="operation_id")
+    return pd.DataFrame(columns, index=index)
+
 
-    chunk_size = 500  # not sure exactly what the limit is here
+def _join_operation_details(
+    change_log: pd.DataFrame,
+    client: CAVEclient,
+    n_jobs: int = -1,
+    executor: ExecutorLike = None,
+) -> pd.DataFrame:
+    operation_ids = [int(operation_id) for operation_id in change_log.index]
+    chunk_details = parallel_map(
+        lambda chunk: _get_operation_details(chunk, client),
+        _chunk_operation_ids(operation_ids),
+        executor=executor,
+        client=client,
+        n_jobs=n_jobs,
+    )
     details = {}
-    for i in range(0, len(change_log), chunk_size):
-        sub_details = cg.get_operation_details(
-            change_log.index[i : i + chunk_size].to_list()
-        )
+    for sub_details in chunk_details:
         details.update(sub_details)
     assert len(details) == len(change_log)
 
-    details = pd.DataFrame(details).T
-    details.index.name = "operation_id"
-    details.index = details.index.astype(int)
+    details = _details_to_frame(details, operation_ids)
 
     change_log = change_log.join(details)
 
     return change_log
 
 
+def _get_change_log_operations(
+    change_log: pd.DataFrame, radius: Radius
+) -> dict[Integer, tuple]:
+    operations = {}
+    for operation_id, row in change_log.iterrows():
+        point = row["sink_coords"][0] if radius is not None else None
+        operations[operation_id] = (row["before_root_ids"], row["roots"], point)
+    return operations
+
+
 def _get_nodes_edges_from_graph(graph):
     if isinstance(graph, tuple):
         nodes, edges = graph
     else:
         nodes = np.unique(graph.flatten())
         edges = graph
+    nodes = np.asarray(nodes, dtype=NODE_DTYPE)
+    edges = np.asarray(edges, dtype=NODE_DTYPE).reshape(-1, 2)
     return nodes, edges
 
 
@@ -179,7 +291,7 @@ def compare_graphs(
             "n_modified_edges": len(added_edges) + len(removed_edges),
         }
     else:
-        metadata_dict = {}
+        metadata_dict = None
 
     return NetworkDelta(
         removed_nodes,
@@ -190,6 +302,378 @@ def compare_graphs(
     )
 
 
+def _get_before_root_ids(
+    after_root_ids: Collection[Integer], timestamp: datetime, client: CAVEclient
+) -> list:
+    maps = client.chunkedgraph.get_past_ids(
+        after_root_ids, timestamp_past=timestamp - TIMESTAMP_DELTA
+    )
+    before_root_ids = []
+    for root in after_root_ids:
+        before_root_ids.extend(maps["past_id_map"][root])
+    return before_root_ids
+
+
+def _get_before_root_ids_from_lineage(
+    after_roots_by_operation: dict[Integer, Collection[Integer]],
+    timestamps_by_operation: dict[Integer, datetime],
+    client: CAVEclient,
+) -> dict[Integer, list]:
+    """Look up the roots before many operations from the lineage graphs of their
+    after roots, rather than with one `get_past_ids` request per operation.
+
+    In a lineage graph, the roots an operation replaced are the predecessors of the
+    roots it created. The lineage graph of a root holds all of its ancestors, so
+    starting from the most recent operations, a handful of requests usually covers
+    every operation on a neuron. All of the roots an operation created descend from
+    the same roots, so one of them being covered is enough. Operations which cannot
+    be resolved this way are left out of the result.
+    """
+    operations_by_after_root = {}
+    for operation_id, after_root_ids in after_roots_by_operation.items():
+        for root_id in after_root_ids:
+            operations_by_after_root[int(root_id)] = operation_id
+
+    seeds = sorted(
+        after_roots_by_operation,
+        key=lambda operation_id: timestamps_by_operation[operation_id],
+        reverse=True,
+    )
+    lineage_graphs_by_root = {}
+    for operation_id in seeds:
+        after_root_ids = [
+            int(root_id) for root_id in after_roots_by_operation[operation_id]
+        ]
+        if any(root_id in lineage_graphs_by_root for root_id in after_root_ids):
+            continue
+        seed_root_id = after_root_ids[0]
+        try:
+            lineage_graph = client.chunkedgraph.get_lineage_graph(
+                seed_root_id, as_nx_graph=True
+            )
+        except HTTPError:
+            continue
+        if seed_root_id not in lineage_graph:
+            continue
+        # only ancestors of the seed are sure to have all of their predecessors
+        covered = nx.ancestors(lineage_graph, seed_root_id) | {seed_root_id}
+        for root_id in covered:
+            if root_id in operations_by_after_root:
+                lineage_graphs_by_root.setdefault(root_id, lineage_graph)
+
+    before_roots_by_operation = {}
+    for operation_id, after_root_ids in after_roots_by_operation.items():
+        for root_id in after_root_ids:
+            lineage_graph = lineage_graphs_by_root.get(int(root_id))
+            if lineage_graph is None:
+                continue
+            before_root_ids = sorted(lineage_graph.predecessors(int(root_id)))
+            if len(before_root_ids) > 0:
+                before_roots_by_operation[operation_id] = before_root_ids
+                break
+    return before_roots_by_operation
+
+
+def _get_operation_bounds(
+    point: Optional[np.ndarray],
+    radius: Union[Number, np.ndarray, None],
+    seg_resolution: np.ndarray,
+) -> Optional[np.ndarray]:
+    if radius is None:
+        return None
+    return _make_bbox(radius, np.asarray(point), seg_resolution).T
+
+
+def _bounds_key(bounds: Optional[np.ndarray]) -> Optional[tuple]:
+    if bounds is None:
+        return None
+    return tuple(np.asarray(bounds).ravel().tolist())
+
+
+def _bounds_volume(bounds: np.ndarray) -> float:
+    return float(np.prod(np.maximum(bounds[:, 1] - bounds[:, 0], 0)))
+
+
+def _enclosing_bounds(bounds1: np.ndarray, bounds2: np.ndarray) -> np.ndarray:
+    return np.stack(
+        (
+            np.minimum(bounds1[:, 0], bounds2[:, 0]),
+            np.maximum(bounds1[:, 1], bounds2[:, 1]),
+        ),
+        axis=1,
+    )
+
+
+def _plan_level2_fetches(
+    requests: dict[Integer, dict[Optional[tuple], Optional[np.ndarray]]],
+    max_bounds_expansion: Optional[float],
+) -> tuple[list[tuple[Integer, Optional[np.ndarray]]], dict[tuple, int]]:
+    """Decide which level2 graphs to fetch to cover a set of requests.
+
+    Parameters
+    ----------
+    requests :
+        For each root ID, a dictionary mapping a key for each requested bounding box
+        to the bounding box itself (or None for the whole graph).
+    max_bounds_expansion :
+        Requests for the same root are combined into a single fetch of their
+        enclosing bounding box when it has at most this many times the volume of the
+        boxes it covers, fetched separately. If None, only identical requests are
+        combined.
+
+    Returns
+    -------
+    :
+        The (root ID, bounding box) of each fetch to make.
+    :
+        A mapping from each requested (root ID, bounding box key) to the index of the
+        fetch which covers it.
+    """
+    fetches = []
+    fetch_index = {}
+    for root_id, bounds_by_key in requests.items():
+        if max_bounds_expansion is None:
+            for key, bounds in bounds_by_key.items():
+                fetch_index[(root_id, key)] = len(fetches)
+                fetches.append((root_id, bounds))
+            continue
+        if None in bounds_by_key:
+            # the whole graph covers any box, so one fetch is enough
+            for key in bounds_by_key:
+                fetch_index[(root_id, key)] = len(fetches)
+            fetches.append((root_id, None))
+            continue
+
+        # greedily grow clusters of nearby boxes, in order along the first axis
+        clusters = []
+        for key in sorted(bounds_by_key):
+            bounds = np.asarray(bounds_by_key[key])
+            volume = _bounds_volume(bounds)
+            for cluster in clusters:
+                enclosing = _enclosing_bounds(cluster["bounds"], bounds)
+                covered_volume = cluster["covered_volume"] + volume
+                if _bounds_volume(enclosing) <= max_bounds_expansion * covered_volume:
+                    cluster["bounds"] = enclosing
+                    cluster["covered_volume"] = covered_volume
+                    cluster["keys"].append(key)
+                    break
+            else:
+                clusters.append(
+                    {"bounds": bounds, "covered_volume": volume, "keys": [key]}
+                )
+        for cluster in clusters:
+            for key in cluster["keys"]:
+                fetch_index[(root_id, key)] = len(fetches)
+            fetches.append((root_id, cluster["bounds"]))
+    return fetches, fetch_index
+
+
+def _partial_edits_error(
+    networkdeltas: dict[Integer, NetworkDelta], errors: dict[Integer, Exception]
+) -> PartialResultError:
+    first_error = next(iter(errors.values()))
+    error = PartialResultError(
+        f"Failed to extract {len(errors)} of {len(networkdeltas) + len(errors)} "
+        f"operations, first with: {first_error!r}",
+        networkdeltas,
+        errors,
+    )
+    error.__cause__ = first_error
+    return error
+
+
+def _get_level2_edits_from_roots(
+    roots_by_operation: dict[Integer, tuple],
+    client: CAVEclient,
+    metadata: bool = False,
+    n_jobs: int = -1,
+    verbose: bool = True,
+    cache: Optional[Level2Cache] = None,
+    max_bounds_expansion: Optional[float] = None,
+    executor: ExecutorLike = None,
+) -> dict[Integer, NetworkDelta]:
+    """Extract changes to the level2 graph for many operations, fetching the level2
+    graph of each root only once even if it is involved in several operations.
+
+    `roots_by_operation` maps each operation ID to a tuple of its before root IDs,
+    after root IDs and bounding box. If some fetches fail, the other operations are
+    still extracted and returned in a `PartialResultError`.
+    """
+    requests = {}
+    for before_root_ids, after_root_ids, bounds in roots_by_operation.values():
+        for root_id in (*before_root_ids, *after_root_ids):
+            requests.setdefault(int(root_id), {})[_bounds_key(bounds)] = bounds
+
+    # combining boxes means cropping locally, which needs the chunk layout; every
+    # bounded request is then cropped the same way, whether or not its fetch was
+    # combined, so that the before and after graphs of an operation are comparable
+    layout = None
+    if max_bounds_expansion is not None:
+        layout = _get_level2_chunk_layout(client)
+        if layout is None:
+            max_bounds_expansion = None
+    fetches, fetch_index = _plan_level2_fetches(requests, max_bounds_expansion)
+
+    def _fetch(fetch):
+        root_id, bounds = fetch
+        return _get_level2_nodes_edges(root_id, client, bounds=bounds, cache=cache)
+
+    fetch_errors = {}
+    try:
+        results = parallel_map(
+            _fetch,
+            fetches,
+            executor=executor,
+            client=client,
+            n_jobs=n_jobs,
+            verbose=verbose,
+            desc="Fetching level2 graphs",
+            salvage=True,
+        )
+    except PartialResultError as error:
+        results = error.results
+        fetch_errors = error.errors
+
+    def _get_nodes_edges(root_ids, bounds):
+        all_nodes = [np.empty(0, dtype=NODE_DTYPE)]
+        all_edges = [np.empty((0, 2), dtype=NODE_DTYPE)]
+        for root_id in root_ids:
+            nodes, edges = results[fetch_index[(int(root_id), _bounds_key(bounds))]]
+            # a single node with no edges is the fallback for a root with one level2
+            # node, which is returned whatever the box, so it is never cropped
+            is_single_node = len(nodes) == 1 and len(edges) == 0
+            if layout is not None and bounds is not None and not is_single_node:
+                nodes, edges = _crop_level2_nodes_edges(nodes, edges, bounds, layout)
+            all_nodes.append(nodes)
+            all_edges.append(edges)
+        all_nodes = np.concatenate(all_nodes, dtype=NODE_DTYPE)
+        all_edges = np.concatenate(all_edges, dtype=NODE_DTYPE)
+        return all_nodes, all_edges
+
+    networkdeltas = {}
+    errors = {}
+    for operation_id, roots in roots_by_operation.items():
+        before_root_ids, after_root_ids, bounds = roots
+        failed = [
+            fetch_errors[fetch_index[(int(root_id), _bounds_key(bounds))]]
+            for root_id in (*before_root_ids, *after_root_ids)
+            if fetch_index[(int(root_id), _bounds_key(bounds))] in fetch_errors
+        ]
+        if len(failed) > 0:
+            errors[operation_id] = failed[0]
+            continue
+        networkdelta = compare_graphs(
+            _get_nodes_edges(before_root_ids, bounds),
+            _get_nodes_edges(after_root_ids, bounds),
+        )
+        if metadata:
+            networkdelta.metadata["operation_id"] = operation_id
+        networkdeltas[operation_id] = networkdelta
+    if len(errors) > 0:
+        raise _partial_edits_error(networkdeltas, errors)
+    return networkdeltas
+
+
+def _networkdelta_touches_bounds(
+    networkdelta: NetworkDelta, bounds: np.ndarray, layout: dict
+) -> bool:
+    changed_nodes = np.concatenate(
+        (
+            networkdelta.added_nodes,
+            networkdelta.removed_nodes,
+            networkdelta.added_edges.ravel(),
+            networkdelta.removed_edges.ravel(),
+        )
+    )
+    # every operation changes the level2 graph, so no change means the box was too
+    # small to contain any edges of the changed nodes
+    if len(changed_nodes) == 0:
+        return True
+    return _level2_nodes_touch_bounds(changed_nodes, bounds, layout)
+
+
+def _get_level2_edits_from_points(
+    operations: dict[Integer, tuple],
+    client: CAVEclient,
+    radius: Radius = DEFAULT_RADIUS,
+    **kwargs,
+) -> dict[Integer, NetworkDelta]:
+    """Extract changes to the level2 graph for many operations, in a bounding box of
+    `radius` around each operation's point.
+
+    `operations` maps each operation ID to a tuple of its before root IDs, after root
+    IDs and point. If `radius` is "adaptive", the box starts `ADAPTIVE_START_CHUNKS`
+    level2 chunks out from the point along each axis, and is doubled for the
+    operations whose changes reach the edge of their box, or which show no changes at
+    all, until none do. Past `ADAPTIVE_MAX_CHUNKS`, the whole level2 graphs are
+    compared. Other arguments are passed to `_get_level2_edits_from_roots`.
+    """
+    seg_resolution = client.chunkedgraph.base_resolution
+    errors = {}
+
+    def _get_edits(operation_ids, radius):
+        roots_by_operation = {}
+        for operation_id in operation_ids:
+            before_root_ids, after_root_ids, point = operations[operation_id]
+            roots_by_operation[operation_id] = (
+                before_root_ids,
+                after_root_ids,
+                _get_operation_bounds(point, radius, seg_resolution),
+            )
+        try:
+            networkdeltas = _get_level2_edits_from_roots(
+                roots_by_operation, client, **kwargs
+            )
+        except PartialResultError as error:
+            networkdeltas = error.results
+            errors.update(error.errors)
+        return networkdeltas, roots_by_operation
+
+    def _finish(networkdeltas):
+        networkdeltas = {
+            operation_id: networkdeltas[operation_id]
+            for operation_id in operations
+            if operation_id in networkdeltas
+        }
+        if len(errors) > 0:
+            raise _partial_edits_error(networkdeltas, errors)
+        return networkdeltas
+
+    if radius != "adaptive":
+        return _finish(_get_edits(operations.keys(), radius)[0])
+
+    # whether a change reaches the edge of its box is read off the chunks of the
+    # changed nodes; without the chunk layout, fall back to the fixed default
+    layout = _get_level2_chunk_layout(client)
+    if layout is None:
+        return _finish(_get_edits(operations.keys(), DEFAULT_RADIUS)[0])
+
+    # boxes are measured in chunks, since chunks are often far from isotropic; the
+    # extra half chunk covers the chunk that the point itself is in
+    chunk_size_nm = layout["chunk_size"] * seg_resolution
+    networkdeltas = {}
+    pending = list(operations.keys())
+    n_chunks = ADAPTIVE_START_CHUNKS
+    while len(pending) > 0:
+        if n_chunks is not None:
+            radius = (n_chunks + 0.5) * chunk_size_nm
+        else:
+            radius = None
+        round_networkdeltas, roots_by_operation = _get_edits(pending, radius)
+        pending = []
+        for operation_id, networkdelta in round_networkdeltas.items():
+            bounds = roots_by_operation[operation_id][2]
+            if bounds is not None and _networkdelta_touches_bounds(
+                networkdelta, bounds, layout
+            ):
+                pending.append(operation_id)
+            else:
+                networkdeltas[operation_id] = networkdelta
+        if n_chunks is not None:
+            n_chunks = n_chunks * 2 if n_chunks < ADAPTIVE_MAX_CHUNKS else None
+    return _finish(networkdeltas)
+
+
 def get_operation_level2_edit(
     operation_id: int,
     client: CAVEclient,
@@ -197,8 +681,9 @@ def get_operation_level2_edit(
     after_root_ids: Optional[Collection[int]] = None,
     timestamp: Optional[datetime] = None,
     point: Optional[np.ndarray] = None,
-    radius: Number = 20_000,
+    radius: Radius = DEFAULT_RADIUS,
     metadata: bool = False,
+    cache: Optional[Level2Cache] = None,
 ) -> NetworkDelta:
     """Extract changes to the level2 graph for a specific operation.
 
@@ -221,22 +706,24 @@ def get_operation_level2_edit(
         The point to center the bounding box on. If None, will compare the entire
         level2 graphs of the objects before and after the operation.
     radius :
-        The radius of the bounding box to use.
+        The radius of the bounding box to use, in nanometers. If "adaptive", starts
+        with a box a few level2 chunks across and doubles it while the changes reach
+        the edge of the box, so that most operations need only a small fetch. If None,
+        compares the entire level2 graphs.
     metadata :
         Whether to include metadata about the changes in the output.
+    cache :
+        Cache for level2 graph fetches. If None, the cache set by `set_level2_cache`
+        is used, if any.
 
     Returns
     -------
     :
         The changes to the level2 graph from this operation.
     """
+    client = schedule_client(client)
     if before_root_ids is None and timestamp is not None:
-        maps = client.chunkedgraph.get_past_ids(
-            after_root_ids, timestamp_past=timestamp - TIMESTAMP_DELTA
-        )
-        before_root_ids = []
-        for root in after_root_ids:
-            before_root_ids.extend(maps["past_id_map"][root])
+        before_root_ids = _get_before_root_ids(after_root_ids, timestamp, client)
 
     # if the point to center on is not provided, or if there is no list of ids that
     # came before this edit, then we need to look them up
@@ -254,26 +741,29 @@ def get_operation_level2_edit(
             after_root_ids = details["roots"]
         if before_root_ids is None:
             timestamp = datetime.fromisoformat(details["timestamp"])
-            pre_timestamp = timestamp - TIMESTAMP_DELTA
-            maps = client.chunkedgraph.get_past_ids(
-                after_root_ids, timestamp_past=pre_timestamp
-            )
-            before_root_ids = []
-            for root in after_root_ids:
-                before_root_ids.extend(maps["past_id_map"][root])
-
-    if radius is None:
-        bbox_cg = None
-    else:
-        bbox_cg = _make_bbox(radius, point, client.chunkedgraph.base_resolution).T
+            before_root_ids = _get_before_root_ids(after_root_ids, timestamp, client)
+
+    if radius == "adaptive":
+        return _get_level2_edits_from_points(
+            {operation_id: (before_root_ids, after_root_ids, point)},
+            client,
+            radius=radius,
+            metadata=metadata,
+            n_jobs=1,
+            verbose=False,
+            cache=cache,
+            max_bounds_expansion=None,
+        )[operation_id]
+
+    bbox_cg = _get_operation_bounds(point, radius, client.chunkedgraph.base_resolution)
 
     # grabbing the union of before/after nodes/edges
     # NOTE: this is where all the compute time comes from
     all_before_nodes, all_before_edges = _get_all_nodes_edges(
-        before_root_ids, client, bounds=bbox_cg
+        before_root_ids, client, bounds=bbox_cg, cache=cache
     )
     all_after_nodes, all_after_edges = _get_all_nodes_edges(
-        after_root_ids, client, bounds=bbox_cg
+        after_root_ids, client, bounds=bbox_cg, cache=cache
     )
 
     networkdelta = compare_graphs(
@@ -288,10 +778,13 @@ def get_operation_level2_edit(
 def get_operations_level2_edits(
     operation_ids: Union[Collection[Integer], Integer],
     client: CAVEclient,
-    radius: Number = 20_000,
+    radius: Radius = DEFAULT_RADIUS,
     metadata: bool = False,
     n_jobs: int = -1,
     verbose: bool = True,
+    cache: Optional[Level2Cache] = None,
+    max_bounds_expansion: Optional[float] = None,
+    executor: ExecutorLike = None,
 ) -> dict[Integer, NetworkDelta]:
     """Extract changes to the level2 graph for a list of operations.
 
@@ -303,19 +796,43 @@ def get_operations_level2_edits(
     client :
         The CAVEclient instance to use.
     radius :
-        The radius of the bounding box to use.
+        The radius of the bounding box to use, in nanometers. If "adaptive", starts
+        with a box a few level2 chunks across and doubles it while the changes reach
+        the edge of the box, so that most operations need only a small fetch. If None,
+        compares the entire level2 graphs.
     metadata :
         Whether to include metadata about the changes in the output.
     n_jobs :
-        The number of jobs to run in parallel. If -1, will use all available cores.
+        The number of requests to run concurrently. If -1, uses the limit set by
+        `set_max_in_flight`.
     verbose :
         Whether to display a progress bar.
+    cache :
+        Cache for level2 graph fetches. If None, the cache set by `set_level2_cache`
+        is used, if any.
+    max_bounds_expansion :
+        The level2 graph of each root is fetched once and shared by all of the
+        operations which involve it. Bounding boxes for the same root are also fetched
+        together as their enclosing box when it has at most this many times the volume
+        of the separate boxes, and cropped locally. If None, the default, only
+        identical requests are shared, and nothing is cropped locally.
+    executor :
+        How to run requests in parallel; see `set_executor`. If None, uses the
+        executor set by `set_executor`, or threads if none is set.
 
     Returns
     -------
     :
         The changes to the level2 graph from these operations
+
+
+    Raises
+    ------
+    PartialResultError
+        If requests for some operations failed even after retrying. Its `results`
+        holds the changes from the operations which succeeded.
     """
+    client = schedule_client(client)
     if isinstance(operation_ids, (int, np.integer)):
         operation_ids = [operation_ids]
     if not isinstance(operation_ids, list):
@@ -326,60 +843,106 @@ def get_operations_level2_edits(
                 f"`operation_ids` could not be coerced to a list: {operation_ids}"
             )
 
+    # resolved once here so that every worker uses the same cache
+    if cache is None:
+        cache = get_level2_cache()
+
     details_by_operation = client.chunkedgraph.get_operation_details(operation_ids)
-    new_roots_by_operation = {
-        int(operation_id): details["roots"]
+    details_by_operation = {
+        int(operation_id): details
+        for operation_id, details in details_by_operation.items()
+    }
+    after_roots_by_operation = {
+        operation_id: details["roots"]
         for operation_id, details in details_by_operation.items()
     }
     timestamps_by_operation = {
-        int(operation_id): datetime.fromisoformat(details["timestamp"])
+        operation_id: datetime.fromisoformat(details["timestamp"])
         for operation_id, details in details_by_operation.items()
     }
 
-    inputs_by_operation = []
+    before_roots_by_operation = _get_before_root_ids_from_lineage(
+        after_roots_by_operation, timestamps_by_operation, client
+    )
+
+    def _get_before_roots(operation_id):
+        return _get_before_root_ids(
+            after_roots_by_operation[operation_id],
+            timestamps_by_operation[operation_id],
+            client,
+        )
+
+    # anything the lineage graphs did not cover is looked up one operation at a time
+    unresolved = [
+        operation_id
+        for operation_id in after_roots_by_operation
+        if operation_id not in before_roots_by_operation
+    ]
+    errors = {}
+    try:
+        unresolved_before_roots = parallel_map(
+            _get_before_roots,
+            unresolved,
+            executor=executor,
+            client=client,
+            n_jobs=n_jobs,
+            salvage=True,
+        )
+    except PartialResultError as error:
+        unresolved_before_roots = error.results
+        errors.update(
+            (unresolved[index], index_error)
+            for index, index_error in error.errors.items()
+        )
+    before_roots_by_operation.update(
+        (operation_id, before_root_ids)
+        for operation_id, before_root_ids in zip(unresolved, unresolved_before_roots)
+        if operation_id not in errors
+    )
+
+    operations = {}
     for operation_id in operation_ids:
-        inputs_by_operation.append(
-            {
-                "operation_id": operation_id,
-                "client": client,
-                "before_root_ids": None,
-                "after_root_ids": new_roots_by_operation[operation_id],
-                "timestamp": timestamps_by_operation[operation_id],
-                "radius": radius,
-                "metadata": metadata,
-            }
+        if int(operation_id) not in before_roots_by_operation:
+            continue
+        details = details_by_operation[int(operation_id)]
+        point = details["sink_coords"][0] if radius is not None else None
+        operations[operation_id] = (
+            before_roots_by_operation[int(operation_id)],
+            after_roots_by_operation[int(operation_id)],
+            point,
         )
-    if n_jobs != 1:
-        with tqdm_joblib(
-            total=len(inputs_by_operation),
-            disable=not verbose,
-            desc="Extracting level2 edits",
-        ):
-            networkdeltas = Parallel(n_jobs=-1)(
-                delayed(get_operation_level2_edit)(**inputs)
-                for inputs in inputs_by_operation
-            )
-    else:
-        networkdeltas = []
-        for inputs in tqdm(
-            inputs_by_operation,
-            disable=not verbose,
-            desc="Extracting level2 edits",
-        ):
-            networkdeltas.append(get_operation_level2_edit(**inputs))
 
-    networkdeltas = dict(zip(operation_ids, networkdeltas))
+    try:
+        networkdeltas = _get_level2_edits_from_points(
+            operations,
+            client,
+            radius=radius,
+            metadata=metadata,
+            n_jobs=n_jobs,
+            verbose=verbose,
+            cache=cache,
+            max_bounds_expansion=max_bounds_expansion,
+            executor=executor,
+        )
+    except PartialResultError as error:
+        networkdeltas = error.results
+        errors.update(error.errors)
+    if len(errors) > 0:
+        raise _partial_edits_error(networkdeltas, errors)
     return networkdeltas
 
 
 def get_root_level2_edits(
     root_id: Integer,
     client: CAVEclient,
-    radius: Number = 20_000,
+    radius: Radius = DEFAULT_RADIUS,
     metadata: bool = False,
     filtered: bool = False,
     n_jobs: int = -1,
     verbose: bool = True,
+    cache: Optional[Level2Cache] = None,
+    max_bounds_expansion: Optional[float] = None,
+    executor: ExecutorLike = None,
 ) -> dict[Integer, NetworkDelta]:
     """Extract changes to the level2 graph for all operations on a root.
 
@@ -390,60 +953,64 @@ def get_root_level2_edits(
     client :
         The CAVEclient instance to use.
     radius :
-        The radius of the bounding box to use.
+        The radius of the bounding box to use, in nanometers. If "adaptive", starts
+        with a box a few level2 chunks across and doubles it while the changes reach
+        the edge of the box, so that most operations need only a small fetch. If None,
+        compares the entire level2 graphs.
     metadata :
         Whether to include metadata about the changes in the output.
     filtered :
         Whether to filter the change log to only include changes which affect the
         final state of the root ID.
     n_jobs :
-        The number of jobs to run in parallel. If -1, will use all available cores.
+        The number of requests to run concurrently. If -1, uses the limit set by
+        `set_max_in_flight`.
     verbose :
         Whether to display a progress bar.
+    cache :
+        Cache for level2 graph fetches. If None, the cache set by `set_level2_cache`
+        is used, if any.
+    max_bounds_expansion :
+        The level2 graph of each root is fetched once and shared by all of the
+        operations which involve it. Bounding boxes for the same root are also fetched
+        together as their enclosing box when it has at most this many times the volume
+        of the separate boxes, and cropped locally. If None, the default, only
+        identical requests are shared, and nothing is cropped locally.
+    executor :
+        How to run requests in parallel; see `set_executor`. If None, uses the
+        executor set by `set_executor`, or threads if none is set.
 
     Returns
     -------
     :
         The changes to the level2 graph from each operation
-    """
-    change_log = get_detailed_change_log(root_id, client, filtered=filtered)
 
-    inputs_by_operation = []
-    for operation_id, row in change_log.iterrows():
-        inputs_by_operation.append(
-            {
-                "operation_id": operation_id,
-                "client": client,
-                "before_root_ids": row["before_root_ids"],
-                "after_root_ids": row["roots"],
-                "timestamp": None,  # not needed since we know roots before/after
-                "radius": radius,
-                "metadata": metadata,
-            }
-        )
 
-    if n_jobs != 1:
-        with tqdm_joblib(
-            total=len(inputs_by_operation),
-            disable=not verbose,
-            desc="Extracting level2 edits",
-        ):
-            networkdeltas_by_operation = Parallel(n_jobs=-1)(
-                delayed(get_operation_level2_edit)(**inputs)
-                for inputs in inputs_by_operation
-            )
-    else:
-        networkdeltas_by_operation = []
-        for inputs in tqdm(
-            inputs_by_operation,
-            disable=not verbose,
-            desc="Extracting level2 edits",
-        ):
-            networkdeltas_by_operation.append(get_operation_level2_edit(**inputs))
+    Raises
+    ------
+    PartialResultError
+        If requests for some operations failed even after retrying. Its `results`
+        holds the changes from the operations which succeeded.
+    """
+    client = schedule_client(client)
+    if cache is None:
+        cache = get_level2_cache()
 
-    networkdeltas_by_operation = dict(zip(change_log.index, networkdeltas_by_operation))
+    change_log = get_detailed_change_log(
+        root_id, client, filtered=filtered, n_jobs=n_jobs, executor=executor
+    )
 
-    return networkdeltas_by_operation
+    return _get_level2_edits_from_points(
+        _get_change_log_operations(change_log, radius),
+        client,
+        radius=radius,
+        metadata=metadata,
+        n_jobs=n_jobs,
+        verbose=verbose,
+        cache=cache,
+        max_bounds_expansion=max_bounds_expansion,
+        executor=executor,
+    )
 
 
 def get_metaedits(
@@ -459,65 +1026,74 @@ def get_metaedits(
     Parameters
     ----------
     networkdeltas :
-        The changes to the level2 graph from each operation.
+        The changes to the level2 graph from each operation, in the order they
+        happened.
 
     Returns
     -------
     :
-        The changes to the level2 graph from each meta-operation.
+        The net changes to the level2 graph from each meta-operation.
     :
         A mapping of meta-operation IDs to the operation IDs that make them up.
 
     """
-    # find the nodes that are modified in any way by each operation
-    mod_sets = {}
-    for edit_id, delta in networkdeltas.items():
-        mod_set = []
-        mod_set += delta.added_nodes.tolist()
-        mod_set += delta.removed_nodes.tolist()
-        try:
-            mod_set += delta.added_edges[:, 0].tolist()
-        except IndexError as e:
-            print(delta.added_edges)
-            print(type(delta.added_edges))
-            print(delta.added_edges.shape)
-            raise e
-        mod_set += delta.added_edges[:, 1].tolist()
-        mod_set += delta.removed_edges[:, 0].tolist()
-        mod_set += delta.removed_edges[:, 1].tolist()
-        mod_set = np.unique(mod_set)
-        mod_sets[edit_id] = mod_set
-
-    # make an incidence matrix of which nodes are modified by which operations
-    index = np.unique(np.concatenate(list(mod_sets.values())))
-    node_edit_indicators = pd.DataFrame(
-        index=index, columns=networkdeltas.keys(), data=False
+    # find the nodes that are modified in any way by each operation, as flat arrays of
+    # (operation position, node) pairs. a plain dictionary is not converted to a
+    # DeltaTable, so that its operation IDs can be of any hashable type
+    if isinstance(networkdeltas, DeltaTable):
+        operation_positions, nodes = networkdeltas.touched_nodes()
+    else:
+        node_arrays = [np.empty(0, dtype=NODE_DTYPE)]
+        lengths = []
+        for networkdelta in networkdeltas.values():
+            delta_nodes = [
+                networkdelta.removed_nodes,
+                networkdelta.added_nodes,
+                networkdelta.removed_edges.reshape(-1),
+                networkdelta.added_edges.reshape(-1),
+            ]
+            node_arrays.extend(delta_nodes)
+            lengths.append(sum(len(array) for array in delta_nodes))
+        nodes = np.concatenate(node_arrays)
+        operation_positions = np.repeat(np.arange(len(lengths)), lengths)
+
+    # make a sparse incidence matrix of which nodes are modified by which operations
+    _, node_positions = np.unique(nodes, return_inverse=True)
+    n_nodes = node_positions.max() + 1 if len(node_positions) > 0 else 0
+    X = csr_array(
+        (
+            np.ones(len(node_positions), dtype=np.int64),
+            (node_positions.reshape(-1), operation_positions),
+        ),
+        shape=(n_nodes, len(networkdeltas)),
     )
-    for edit_id, mod_set in mod_sets.items():
-        node_edit_indicators.loc[mod_set, edit_id] = True
 
     # this inner product matrix tells us which operations are connected with at least
     # one overlapping node in common
-    X = csr_array(node_edit_indicators.values.astype(int))
     product = X.T @ X
 
     # meta-operations are connected components in the above graph
     _, labels = connected_components(product, directed=False)
 
+    edit_ids = list(networkdeltas.keys())
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
     meta_operation_map = {}
     operation_map = {}
-    for label in np.unique(labels):
-        edits = node_edit_indicators.columns[labels == label].tolist()
+    for positions in np.split(order, boundaries) if len(order) > 0 else []:
+        label = labels[positions[0]].item()
+        edits = [edit_ids[position] for position in positions]
         meta_operation_map[label] = edits
         for edit in edits:
-            operation_map[edit] = label.item()
+            operation_map[edit] = label
 
-    # for each meta-operation, combine the deltas of the operations that make it up
+    # for each meta-operation, compose the deltas of the operations that make it up,
+    # in order, so that anything one operation adds and a later one removes cancels
     networkdeltas_by_meta_operation = {}
     for meta_operation_id, operation_ids in meta_operation_map.items():
         meta_operation_id = int(meta_operation_id)
         deltas = [networkdeltas[operation_id] for operation_id in operation_ids]
-        meta_networkdelta = combine_deltas(deltas)
+        meta_networkdelta = compose_deltas(deltas)
         networkdeltas_by_meta_operation[meta_operation_id] = meta_networkdelta
 
     return networkdeltas_by_meta_operation, operation_map
@@ -574,8 +1150,8 @@ def check_graph_changes(graphs_by_state: dict):
     for state_iloc in range(1, len(states)):
         last_state = states[state_iloc - 1]
         this_state = states[state_iloc]
-        last_graph = graphs_by_state[last_state]
-        this_graph = graphs_by_state[this_state]
+        last_graph = _as_networkx(graphs_by_state[last_state])
+        this_graph = _as_networkx(graphs_by_state[this_state])
         graphs_changed = not nx.utils.graphs_equal(last_graph, this_graph)
         states_is_new[this_state] = graphs_changed
     return states_is_new
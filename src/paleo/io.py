@@ -1,9 +1,29 @@
 import json
+import os
+import struct
+from itertools import chain
+from os import PathLike
+from typing import IO, Collection, Iterator, Optional, Union
 
 import networkx as nx
 import numpy as np
 
 from paleo import NetworkDelta
+from paleo.networkdelta import OPERATION_ID_DTYPE, _json_default
+
+FileLike = Union[str, PathLike, IO[bytes]]
+
+_DELTA_FIELDS = ("removed_nodes", "added_nodes", "removed_edges", "added_edges")
+
+_FORMAT_VERSION = 1
+
+# the stream format is a magic string followed by one record per operation: a header
+# of the operation ID as int64, the number of rows of each field and the length of the
+# metadata, then the rows of each field as little-endian uint64, then the metadata as
+# JSON
+_STREAM_MAGIC = b"PALEOED1"
+_RECORD_HEADER = struct.Struct("<q4QI")
+_ROW_DTYPE = np.dtype("<u8")
 
 
 def edits_to_json(networkdeltas_by_operation: dict) -> str:
@@ -36,3 +56,352 @@ def json_to_graph(json_str):
     graph.add_nodes_from(nodes)
     graph.add_edges_from(edges)
     return graph
+
+
+def _check_kind(data, kind: str) -> None:
+    stored_kind = str(data["kind"]) if "kind" in data else None
+    if stored_kind != kind:
+        raise ValueError(f"Expected a file of {kind}, got {stored_kind}")
+    version = int(data["version"])
+    if version > _FORMAT_VERSION:
+        raise ValueError(
+            f"File was written by a newer version of paleo (format {version})"
+        )
+
+
+def edits_to_npz(
+    networkdeltas_by_operation: dict, file: FileLike, compressed: bool = False
+) -> None:
+    """Save edits to a binary `.npz` file.
+
+    The nodes and edges of each kind are concatenated over all operations into one
+    uint64 array, with an array of offsets marking where each operation's rows start,
+    so saving and loading are bulk array copies. Operation IDs are stored as int64, and
+    metadata as JSON alongside.
+
+    Parameters
+    ----------
+    networkdeltas_by_operation :
+        The changes to the level2 graph from each operation.
+    file :
+        Path or binary file to write to.
+    compressed :
+        Whether to compress the arrays, which makes the file smaller but slower to
+        save and load.
+    """
+    deltas = list(networkdeltas_by_operation.values())
+    arrays = {
+        "kind": np.array("edits"),
+        "version": np.array(_FORMAT_VERSION),
+        "operation_ids": np.fromiter(
+            networkdeltas_by_operation.keys(),
+            dtype=OPERATION_ID_DTYPE,
+            count=len(deltas),
+        ),
+    }
+    for field in _DELTA_FIELDS:
+        shape = (-1, 2) if field.endswith("edges") else (-1,)
+        values = [getattr(delta, field).reshape(shape) for delta in deltas]
+        offsets = np.zeros(len(deltas) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in values], out=offsets[1:])
+        empty = np.empty(0, dtype=np.uint64).reshape(shape)
+        arrays[field] = np.concatenate([empty] + values)
+        arrays[f"{field}_offsets"] = offsets
+    arrays["metadata"] = np.array(
+        json.dumps(
+            [delta.metadata if delta.has_metadata else {} for delta in deltas],
+            default=_json_default,
+        )
+    )
+    if compressed:
+        np.savez_compressed(file, **arrays)
+    else:
+        np.savez(file, **arrays)
+
+
+def npz_to_edits(file: FileLike) -> dict:
+    """Load edits saved by `edits_to_npz`.
+
+    Parameters
+    ----------
+    file :
+        Path or binary file to read from.
+
+    Returns
+    -------
+    :
+        The changes to the level2 graph from each operation.
+    """
+    with np.load(file, allow_pickle=False) as data:
+        _check_kind(data, "edits")
+        operation_ids = data["operation_ids"].tolist()
+        fields = {}
+        for field in _DELTA_FIELDS:
+            fields[field] = (data[field], data[f"{field}_offsets"].tolist())
+        metadatas = json.loads(str(data["metadata"]))
+
+    networkdeltas_by_operation = {}
+    for i, operation_id in enumerate(operation_ids):
+        # slices are views into the concatenated arrays, so no data is copied
+        removed_nodes, added_nodes, removed_edges, added_edges = (
+            values[offsets[i] : offsets[i + 1]] for values, offsets in fields.values()
+        )
+        networkdeltas_by_operation[operation_id] = NetworkDelta(
+            removed_nodes,
+            added_nodes,
+            removed_edges,
+            added_edges,
+            metadata=metadatas[i] or None,
+        )
+    return networkdeltas_by_operation
+
+
+def graph_to_npz(graph: nx.Graph, file: FileLike, compressed: bool = False) -> None:
+    """Save the nodes and edges of a graph to a binary `.npz` file, as uint64 arrays.
+
+    Parameters
+    ----------
+    graph :
+        The graph to save. Node and edge attributes are not saved.
+    file :
+        Path or binary file to write to.
+    compressed :
+        Whether to compress the arrays.
+    """
+    nodes = np.fromiter(graph.nodes, dtype=np.uint64, count=graph.number_of_nodes())
+    edges = np.fromiter(
+        chain.from_iterable(graph.edges),
+        dtype=np.uint64,
+        count=2 * graph.number_of_edges(),
+    ).reshape(-1, 2)
+    arrays = {
+        "kind": np.array("graph"),
+        "version": np.array(_FORMAT_VERSION),
+        "nodes": nodes,
+        "edges": edges,
+    }
+    if compressed:
+        np.savez_compressed(file, **arrays)
+    else:
+        np.savez(file, **arrays)
+
+
+def npz_to_graph(file: FileLike) -> nx.Graph:
+    """Load a graph saved by `graph_to_npz`.
+
+    Parameters
+    ----------
+    file :
+        Path or binary file to read from.
+
+    Returns
+    -------
+    :
+        The graph, with integer node IDs.
+    """
+    with np.load(file, allow_pickle=False) as data:
+        _check_kind(data, "graph")
+        nodes = data["nodes"].tolist()
+        edges = data["edges"].tolist()
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from(edges)
+    return graph
+
+
+def _record_length(header: tuple) -> int:
+    _, n_removed_nodes, n_added_nodes, n_removed_edges, n_added_edges, n_meta = header
+    n_values = n_removed_nodes + n_added_nodes + 2 * (n_removed_edges + n_added_edges)
+    return _ROW_DTYPE.itemsize * n_values + n_meta
+
+
+def _check_magic(f: IO[bytes]) -> None:
+    magic = f.read(len(_STREAM_MAGIC))
+    if magic != _STREAM_MAGIC:
+        raise ValueError("Not a paleo edit stream")
+
+
+class EditsWriter:
+    def __init__(self, file: FileLike, append: bool = True):
+        """
+        Writes edits to a stream file, one record per operation, so that a history can
+        be written as it is extracted without holding all of it in memory.
+
+        Records are appended to the end of the file, and can be read back lazily with
+        `iter_edits`. When appending to a file whose last record was cut short, for
+        instance by an interrupted run, the partial record is dropped first.
+
+        Can be used as a context manager, which closes the file on exit.
+
+        Parameters
+        ----------
+        file :
+            Path or binary file to write to. A file object which already holds a
+            stream is appended to; one which is empty, or `append` is False, starts a
+            new stream at its current position. A file object is not closed by `close`.
+        append :
+            Whether to append to an existing stream at `file`, rather than overwriting
+            it. Must be False for a file object which cannot seek, since whether it
+            already holds a stream cannot be checked.
+        """
+        self._owns_file = isinstance(file, (str, PathLike))
+        if self._owns_file:
+            exists = os.path.exists(file) and os.path.getsize(file) > 0
+            if append and exists:
+                self._file = open(file, "r+b")
+                self._file.truncate(_valid_length(self._file))
+                self._file.seek(0, os.SEEK_END)
+            else:
+                self._file = open(file, "wb")
+                self._file.write(_STREAM_MAGIC)
+        else:
+            self._file = file
+            if append:
+                _seek_to_stream_end(file)
+            else:
+                self._file.write(_STREAM_MAGIC)
+
+    def __enter__(self) -> "EditsWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, operation_id: int, networkdelta: NetworkDelta) -> None:
+        """Write the edit from one operation."""
+        arrays = [
+            np.asarray(getattr(networkdelta, field), dtype=_ROW_DTYPE)
+            for field in _DELTA_FIELDS
+        ]
+        metadata = b""
+        if networkdelta.has_metadata:
+            metadata = json.dumps(networkdelta.metadata, default=_json_default).encode()
+        header = _RECORD_HEADER.pack(
+            int(operation_id), *(len(array) for array in arrays), len(metadata)
+        )
+        # one write per record, so a record is only ever cut short at the end
+        self._file.write(
+            b"".join([header, *(array.tobytes() for array in arrays), metadata])
+        )
+
+    def write_all(self, networkdeltas_by_operation: dict) -> None:
+        """Write the edits from many operations."""
+        for operation_id, networkdelta in networkdeltas_by_operation.items():
+            self.write(operation_id, networkdelta)
+
+    def flush(self) -> None:
+        """Flush written records to the file."""
+        self._file.flush()
+
+    def close(self) -> None:
+        """Flush written records, and close the file if it was opened by this
+        writer."""
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+def _seek_to_stream_end(f: IO[bytes]) -> None:
+    """Position a file object to append records to the stream it holds, dropping a
+    partial last record, or start a new stream in it if it is empty."""
+    if not f.seekable():
+        raise ValueError(
+            "Cannot append to a file object which cannot seek; pass `append=False` to "
+            "start a new stream in it"
+        )
+    if f.seek(0, os.SEEK_END) == 0:
+        f.write(_STREAM_MAGIC)
+        return
+    # a file opened for appending only cannot be read to be checked, but writes to it
+    # always go to its end anyway
+    if f.readable():
+        length = _valid_length(f)
+        f.seek(length)
+        f.truncate(length)
+
+
+def _valid_length(f: IO[bytes]) -> int:
+    """The length of a stream file up to the end of its last complete record."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    _check_magic(f)
+    position = f.tell()
+    while position + _RECORD_HEADER.size <= size:
+        header = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+        end = position + _RECORD_HEADER.size + _record_length(header)
+        if end > size:
+            break
+        position = f.seek(end)
+    return position
+
+
+def iter_edits(
+    file: FileLike, operation_ids: Optional[Collection[int]] = None
+) -> Iterator[tuple[int, NetworkDelta]]:
+    """Lazily read edits written by `EditsWriter`, one operation at a time.
+
+    Parameters
+    ----------
+    file :
+        Path or binary file to read from.
+    operation_ids :
+        If given, only these operations are read; the records of others are skipped
+        without being parsed.
+
+    Yields
+    ------
+    :
+        The operation ID and its changes to the level2 graph, in the order they were
+        written.
+    """
+    if operation_ids is not None:
+        operation_ids = set(operation_ids)
+    owns_file = isinstance(file, (str, PathLike))
+    f = open(file, "rb") if owns_file else file
+    try:
+        _check_magic(f)
+        size = None
+        if f.seekable():
+            position = f.tell()
+            size = f.seek(0, os.SEEK_END)
+            f.seek(position)
+        while True:
+            header_bytes = f.read(_RECORD_HEADER.size)
+            if len(header_bytes) == 0:
+                return
+            if len(header_bytes) < _RECORD_HEADER.size:
+                raise ValueError("Edit stream ends with an incomplete record")
+            header = _RECORD_HEADER.unpack(header_bytes)
+            operation_id = header[0]
+            length = _record_length(header)
+            if operation_ids is not None and operation_id not in operation_ids:
+                if size is not None:
+                    end = f.tell() + length
+                    if end > size:
+                        raise ValueError("Edit stream ends with an incomplete record")
+                    f.seek(end)
+                elif len(f.read(length)) < length:
+                    raise ValueError("Edit stream ends with an incomplete record")
+                continue
+            body = f.read(length)
+            if len(body) < length:
+                raise ValueError("Edit stream ends with an incomplete record")
+
+            n_values = (length - header[5]) // _ROW_DTYPE.itemsize
+            values = np.frombuffer(body, dtype=_ROW_DTYPE, count=n_values)
+            values = values.astype(np.uint64, copy=False)
+            fields = []
+            start = 0
+            for field, n_rows in zip(_DELTA_FIELDS, header[1:5]):
+                n_values = 2 * n_rows if field.endswith("edges") else n_rows
+                fields.append(values[start : start + n_values])
+                start += n_values
+            metadata = None
+            if header[5] > 0:
+                metadata = json.loads(body[len(body) - header[5] :])
+            yield operation_id, NetworkDelta(*fields, metadata=metadata)
+    finally:
+        if owns_file:
+            f.close()
@@ -3,51 +3,70 @@ import warnings
 import networkx as nx
 import numpy as np
 import pandas as pd
-from joblib import Parallel, delayed
 from tqdm import TqdmExperimentalWarning
 
 warnings.filterwarnings("ignore", category=TqdmExperimentalWarning)
 from typing import Optional
 
 from caveclient import CAVEclient
-from tqdm.auto import tqdm
-from tqdm_joblib import tqdm_joblib
 
+from .cache import get_level2_cache
+from .csrgraph import CSRGraph, _as_networkx
+from .parallel import parallel_map
+from .scheduler import schedule_client
 from .utils import _get_level2_nodes_edges, _sort_edgelist
 
 
 def get_initial_node_ids(root_id, client):
+    client = schedule_client(client)
     lineage_g = client.chunkedgraph.get_lineage_graph(root_id, as_nx_graph=True)
     node_in_degree = pd.Series(dict(lineage_g.in_degree()))
     original_node_ids = node_in_degree[node_in_degree == 0].index
     return original_node_ids
 
 
-def get_initial_graph(root_id, client, verbose=True, return_as="networkx", n_jobs=-1):
+def get_initial_graph(
+    root_id,
+    client,
+    verbose=True,
+    return_as="networkx",
+    n_jobs=-1,
+    cache=None,
+    executor=None,
+):
     """Get the initial graph for a given `root_id`, including objects that could become
-    part of the neuron in the future."""
-    if return_as not in ["networkx", "arrays"]:
-        ValueError(f"`return_as` must be 'networkx' or 'arrays', got {return_as}")
+    part of the neuron in the future.
+
+    `return_as` can be 'networkx' for a `networkx.Graph`, 'csr' for a more compact
+    `CSRGraph`, or 'arrays' for a tuple of node and edge arrays. Level2 graphs are
+    read from and written to `cache`, or the cache set by `set_level2_cache`, if any.
+    Up to `n_jobs` level2 graphs are requested at once; if -1, the limit set by
+    `set_max_in_flight` is used. `executor` overrides the one set by `set_executor`."""
+    client = schedule_client(client)
+    if return_as not in ["networkx", "csr", "arrays"]:
+        raise ValueError(
+            f"`return_as` must be 'networkx', 'csr' or 'arrays', got {return_as}"
+        )
 
     original_node_ids = get_initial_node_ids(root_id, client)
 
+    # resolved once here so that every worker uses the same cache
+    if cache is None:
+        cache = get_level2_cache()
+
     def _get_info_for_node(leaf_id):
-        nodes, edges = _get_level2_nodes_edges(leaf_id, client)
+        nodes, edges = _get_level2_nodes_edges(leaf_id, client, cache=cache)
         return nodes, edges
 
-    if n_jobs != 1:
-        with tqdm_joblib(
-            total=len(original_node_ids),
-            disable=not verbose,
-            desc="Getting initial graph",
-        ):
-            outs = Parallel(n_jobs=n_jobs)(
-                delayed(_get_info_for_node)(leaf_id) for leaf_id in original_node_ids
-            )
-    else:
-        outs = []
-        for leaf_id in tqdm(original_node_ids):
-            outs.append(_get_info_for_node(leaf_id))
+    outs = parallel_map(
+        _get_info_for_node,
+        original_node_ids,
+        executor=executor,
+        client=client,
+        n_jobs=n_jobs,
+        verbose=verbose,
+        desc="Getting initial graph",
+    )
 
     all_nodes = []
     all_edges = []
@@ -67,11 +86,14 @@ def get_initial_graph(root_id, client, verbose=True, return_as="networkx", n_job
         graph.add_nodes_from(all_nodes)
         graph.add_edges_from(all_edges)
         return graph
+    elif return_as == "csr":
+        return CSRGraph.from_arrays(all_nodes, all_edges)
     else:  # return_as == 'arrays'
         return all_nodes, all_edges
 
 
 def get_level2_data(graphs_by_state: dict, client: CAVEclient):
+    client = schedule_client(client)
     used_nodes = set()
     for graph in graphs_by_state.values():
         used_nodes.update(graph.nodes())
@@ -86,6 +108,7 @@ def get_level2_spatial_graphs(
     level2_data=None,
     index_on=None,
 ):
+    client = schedule_client(client)
     if level2_data is None and client is not None:
         level2_data = get_level2_data(graphs_by_state, client)
     elif level2_data is None:
@@ -105,7 +128,7 @@ def get_level2_spatial_graphs(
 
     spatial_graphs_by_state = {}
     for state_id, graph in graphs_by_state.items():
-        spatial_graph = graph.copy()
+        spatial_graph = _as_networkx(graph).copy()
         spatial_graph = nx.relabel_nodes(spatial_graph, key_mapping)
         spatial_graphs_by_state[state_id] = spatial_graph
 
@@ -1,22 +1,55 @@
 import json
 import pprint
-from typing import Collection
+from typing import Collection, Optional
 
 import numpy as np
 
+# chunkedgraph IDs are unsigned 64-bit integers
+NODE_DTYPE = np.uint64
+
+# operation IDs are treated as signed integers, as in pandas change logs
+OPERATION_ID_DTYPE = np.int64
+
+
+def _json_default(value):
+    # numpy scalars and arrays, such as operation IDs, end up in metadata
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _as_node_array(nodes, dtype=NODE_DTYPE) -> np.ndarray:
+    return np.asarray(nodes, dtype=dtype).reshape(-1)
+
+
+def _as_edge_array(edges, dtype=NODE_DTYPE) -> np.ndarray:
+    return np.asarray(edges, dtype=dtype).reshape(-1, 2)
+
 
 class NetworkDelta:
+    __slots__ = (
+        "removed_nodes",
+        "added_nodes",
+        "removed_edges",
+        "added_edges",
+        "_metadata",
+    )
+
     def __init__(
         self,
         removed_nodes: np.ndarray,
         added_nodes: np.ndarray,
         removed_edges: np.ndarray,
         added_edges: np.ndarray,
-        metadata: dict = {},
+        metadata: Optional[dict] = None,
     ):
         """
         A class to represent a change to a network.
 
+        Node IDs are stored as `NODE_DTYPE` (uint64), like chunkedgraph IDs, so that
+        arrays from different deltas can be combined without being cast. Arrays which
+        already have this type are not copied.
+
         Parameters
         ----------
         removed_nodes :
@@ -28,13 +61,30 @@ class NetworkDelta:
         added_edges :
             Edges that were added by this operation.
         metadata :
-            A dictionary of arbitrary metadata about the operation.
+            A dictionary of arbitrary metadata about the operation. Only created when
+            first accessed, if not provided.
         """
-        self.removed_nodes = removed_nodes
-        self.added_nodes = added_nodes
-        self.removed_edges = removed_edges
-        self.added_edges = added_edges
-        self.metadata = metadata
+        self.removed_nodes = _as_node_array(removed_nodes)
+        self.added_nodes = _as_node_array(added_nodes)
+        self.removed_edges = _as_edge_array(removed_edges)
+        self.added_edges = _as_edge_array(added_edges)
+        self._metadata = metadata
+
+    @property
+    def metadata(self) -> dict:
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata: dict) -> None:
+        self._metadata = metadata
+
+    @property
+    def has_metadata(self) -> bool:
+        """Whether this delta has any metadata, without creating an empty dictionary
+        for it."""
+        return bool(self._metadata)
 
     def __repr__(self):
         rep = "NetworkDelta(\n"
@@ -42,7 +92,7 @@ class NetworkDelta:
         rep += f"   added_nodes: {self.added_nodes.shape[0]},\n"
         rep += f"   removed_edges: {self.removed_edges.shape[0]},\n"
         rep += f"   added_edges: {self.added_edges.shape[0]},\n"
-        if len(self.metadata) > 0:
+        if self.has_metadata:
             rep += "   metadata: {\n"
             rep += " " + pprint.pformat(self.metadata, indent=6)[1:-1]
             rep += "\n   }\n"
@@ -58,7 +108,7 @@ class NetworkDelta:
             added_nodes=self.added_nodes.tolist(),
             removed_edges=self.removed_edges.tolist(),
             added_edges=self.added_edges.tolist(),
-            metadata=self.metadata,
+            metadata=self._metadata if self._metadata is not None else {},
         )
         return out
 
@@ -66,17 +116,12 @@ class NetworkDelta:
         return json.dumps(self.to_dict())
 
     @classmethod
-    def from_dict(cls, input, dtype=int):
-        removed_nodes = np.array(input["removed_nodes"], dtype=dtype)
-        added_nodes = np.array(input["added_nodes"], dtype=dtype)
-        removed_edges = np.atleast_2d(np.array(input["removed_edges"], dtype=dtype))
-        # TODO these size things are a hack, will not generalize if nodes are 3D
-        if removed_edges.size == 0:
-            removed_edges = np.empty((0, 2), dtype=dtype)
-        added_edges = np.atleast_2d(np.array(input["added_edges"], dtype=dtype))
-        if added_edges.size == 0:
-            added_edges = np.empty((0, 2), dtype=dtype)
-        metadata = input["metadata"]
+    def from_dict(cls, input, dtype=NODE_DTYPE):
+        removed_nodes = _as_node_array(input["removed_nodes"], dtype=dtype)
+        added_nodes = _as_node_array(input["added_nodes"], dtype=dtype)
+        removed_edges = _as_edge_array(input["removed_edges"], dtype=dtype)
+        added_edges = _as_edge_array(input["added_edges"], dtype=dtype)
+        metadata = input["metadata"] or None
         return cls(
             removed_nodes, added_nodes, removed_edges, added_edges, metadata=metadata
         )
@@ -115,7 +160,9 @@ class NetworkDelta:
         return not self.__eq__(other)
 
     def __add__(self, other: "NetworkDelta") -> "NetworkDelta":
-        return combine_deltas([self, other])
+        """Compose this delta with one applied after it; see `compose_deltas`, including
+        its assumption that removed nodes have their edges listed as removed."""
+        return compose_deltas([self, other])
 
     @property
     def is_empty(self) -> bool:
@@ -152,3 +199,100 @@ def combine_deltas(deltas: Collection[NetworkDelta]) -> NetworkDelta:
         total_removed_edges,
         total_added_edges,
     )
+
+
+def _net_changes(
+    removed: np.ndarray,
+    removed_order: np.ndarray,
+    added: np.ndarray,
+    added_order: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find the net removals and additions from a sequence of changes to nodes, or to
+    edges as two-column arrays, where `removed_order` and `added_order` give the
+    position in the sequence of the change which removed or added each row.
+
+    Rows are grouped by value and sorted by when they changed, with additions before
+    removals within one step, as in `apply_edit`. The last change to a row says
+    whether it is there at the end. A row was there to begin with if it was removed
+    in the first step that changed it, since adding a row which is already there does
+    nothing. Rows added then removed, or removed then added, cancel out.
+    """
+    is_edges = removed.ndim == 2
+    if is_edges:
+        removed = np.sort(removed, axis=1)
+        added = np.sort(added, axis=1)
+    values = np.concatenate((removed, added))
+    steps = np.concatenate((removed_order, added_order))
+    is_added = np.zeros(len(values), dtype=bool)
+    is_added[len(removed) :] = True
+    if len(values) == 0:
+        return values, values
+
+    order = 2 * steps + ~is_added
+    if is_edges:
+        sort_index = np.lexsort((order, values[:, 1], values[:, 0]))
+    else:
+        sort_index = np.lexsort((order, values))
+    values = values[sort_index]
+    steps = steps[sort_index]
+    is_added = is_added[sort_index]
+
+    is_new = np.ones(len(values), dtype=bool)
+    if is_edges:
+        is_new[1:] = np.any(values[1:] != values[:-1], axis=1)
+    else:
+        is_new[1:] = values[1:] != values[:-1]
+    firsts = np.flatnonzero(is_new)
+    lasts = np.append(firsts[1:] - 1, len(values) - 1)
+
+    first_steps = np.repeat(steps[firsts], np.diff(np.append(firsts, len(values))))
+    removed_first = ~is_added & (steps == first_steps)
+    was_present = np.logical_or.reduceat(removed_first, firsts)
+    is_present = is_added[lasts]
+    net_removed = values[firsts[was_present & ~is_present]]
+    net_added = values[firsts[~was_present & is_present]]
+    return net_removed, net_added
+
+
+def compose_deltas(deltas: Collection[NetworkDelta]) -> NetworkDelta:
+    """Compose a sequence of deltas into the single delta with the same net effect.
+
+    Unlike `combine_deltas`, the order of `deltas` matters: a node or edge which is
+    added by one delta and removed by a later one does not appear in the result, and
+    likewise for one which is removed and then added back. Works on sorted arrays
+    over all of the deltas at once, rather than one delta at a time.
+
+    Only nodes and edges which the deltas list are changed: removing a node does not
+    remove the edges incident to it. The result therefore matches applying `deltas` in
+    turn with `apply_edit` only if each delta which removes a node also lists that
+    node's edges in `removed_edges`, as the deltas extracted by paleo do. Otherwise,
+    an edge of a removed node which a later delta does not mention is left out of
+    the result's `removed_edges`.
+
+    Parameters
+    ----------
+    deltas :
+        The deltas, in the order they were applied.
+
+    Returns
+    -------
+    :
+        The net change from applying all of `deltas` in order, with nodes and edges
+        sorted.
+    """
+    deltas = list(deltas)
+    steps = np.arange(len(deltas))
+
+    def _gather(field, shape):
+        arrays = [getattr(delta, field) for delta in deltas]
+        lengths = [len(array) for array in arrays]
+        empty = np.empty(0, dtype=NODE_DTYPE).reshape(shape)
+        return np.concatenate([empty] + arrays), np.repeat(steps, lengths)
+
+    removed_nodes, added_nodes = _net_changes(
+        *_gather("removed_nodes", (-1,)), *_gather("added_nodes", (-1,))
+    )
+    removed_edges, added_edges = _net_changes(
+        *_gather("removed_edges", (-1, 2)), *_gather("added_edges", (-1, 2))
+    )
+    return NetworkDelta(removed_nodes, added_nodes, removed_edges, added_edges)
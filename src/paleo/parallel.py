@@ -0,0 +1,297 @@
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Literal, Optional, Union
+
+from joblib import cpu_count
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from tqdm.auto import tqdm
+
+DEFAULT_MAX_IN_FLIGHT = 16
+
+_MAX_IN_FLIGHT = DEFAULT_MAX_IN_FLIGHT
+
+_EXECUTOR = None
+
+_EXECUTOR_NAMES = ("serial", "threads", "processes")
+
+_SERVICES = ("chunkedgraph", "l2cache", "materialize", "info")
+
+# size of the connection pools of the adapters mounted on each session by
+# `_ensure_connection_pool`
+_SESSION_POOL_SIZES = weakref.WeakKeyDictionary()
+
+ExecutorLike = Union[Literal["serial", "threads", "processes"], Executor, None]
+
+
+class PartialResultError(RuntimeError):
+    def __init__(self, message: str, results, errors: dict):
+        """
+        Raised when some of a batch of calls failed, carrying the results of those
+        which succeeded so that they need not be computed again.
+
+        Parameters
+        ----------
+        message :
+            Description of the failure.
+        results :
+            The results which were computed. For `parallel_map`, a list in the order of
+            the items, with None for items which failed; for the edit extraction
+            functions, a dictionary mapping operation IDs to their changes.
+        errors :
+            The error raised for each failed item, keyed by its index in the items or
+            by operation ID.
+        """
+        super().__init__(message)
+        self.results = results
+        self.errors = errors
+
+
+def set_max_in_flight(max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> None:
+    """Set the default number of requests paleo keeps in flight at once.
+
+    Parameters
+    ----------
+    max_in_flight :
+        The maximum number of concurrent requests.
+    """
+    global _MAX_IN_FLIGHT
+    if max_in_flight < 1:
+        raise ValueError("`max_in_flight` must be at least 1.")
+    _MAX_IN_FLIGHT = max_in_flight
+
+
+def get_max_in_flight() -> int:
+    """Get the default number of requests paleo keeps in flight at once."""
+    return _MAX_IN_FLIGHT
+
+
+def _check_executor(executor: ExecutorLike) -> None:
+    if executor is None or isinstance(executor, Executor):
+        return
+    if executor not in _EXECUTOR_NAMES:
+        raise ValueError(
+            "`executor` must be 'serial', 'threads', 'processes', an "
+            f"`concurrent.futures.Executor` or None, got {executor!r}"
+        )
+
+
+def set_executor(executor: ExecutorLike = None) -> ExecutorLike:
+    """Set how paleo runs work in parallel, for every function which does so.
+
+    Parameters
+    ----------
+    executor :
+        One of:
+
+        - "serial", to run everything one at a time in the calling thread.
+        - "threads", to run in a pool of threads.
+        - "processes", to run in a pool of worker processes.
+        - A `concurrent.futures.Executor`, such as a pool shared with the rest of an
+          application, which work is submitted to. Its size is left to the executor.
+        - None, to use threads for requests to the server and processes for
+          computation, which is the default.
+
+        Any function which takes an `executor` argument can override this per call.
+
+    Returns
+    -------
+    :
+        The executor that was set.
+    """
+    global _EXECUTOR
+    _check_executor(executor)
+    _EXECUTOR = executor
+    return executor
+
+
+def get_executor() -> ExecutorLike:
+    """Get the executor set by `set_executor`."""
+    return _EXECUTOR
+
+
+def _resolve_n_workers(n_jobs: Optional[int], kind: str) -> int:
+    # `n_jobs` follows the joblib convention, where negative values mean "as many as
+    # possible"; for I/O that is bounded by the in-flight limit instead of core count
+    if n_jobs is None or n_jobs < 1:
+        if kind == "threads":
+            return get_max_in_flight()
+        return cpu_count()
+    return n_jobs
+
+
+def _ensure_connection_pool(client, pool_size: int) -> None:
+    """Make sure the HTTP connection pools of a `CAVEclient` can hold `pool_size`
+    connections, so that concurrent requests reuse connections rather than opening and
+    discarding new ones.
+
+    A new `HTTPAdapter` with a large enough pool is mounted in place of each plain
+    `HTTPAdapter`, keeping its retry settings. Other adapters are left alone."""
+    if pool_size <= DEFAULT_POOLSIZE:
+        return
+    for service_name in _SERVICES:
+        try:
+            session = getattr(client, service_name).session
+            adapters = session.adapters
+        except Exception:
+            continue
+        if _SESSION_POOL_SIZES.get(session, 0) >= pool_size:
+            continue
+        for prefix in ("https://", "http://"):
+            adapter = adapters.get(prefix)
+            # a subclass may carry other settings, which a new adapter would lose
+            if type(adapter) is not HTTPAdapter:
+                continue
+            session.mount(
+                prefix,
+                HTTPAdapter(
+                    pool_connections=DEFAULT_POOLSIZE,
+                    pool_maxsize=pool_size,
+                    max_retries=adapter.max_retries,
+                ),
+            )
+        _SESSION_POOL_SIZES[session] = pool_size
+
+
+def _run_serial(
+    func: Callable,
+    items: list,
+    verbose: bool,
+    desc: Optional[str],
+    errors: Optional[dict],
+) -> list:
+    results = [None] * len(items)
+    for i, item in enumerate(tqdm(items, disable=not verbose, desc=desc)):
+        try:
+            results[i] = func(item)
+        except Exception as error:
+            if errors is None:
+                raise
+            errors[i] = error
+    return results
+
+
+def _run_on_executor(
+    func: Callable,
+    items: list,
+    executor: Executor,
+    verbose: bool,
+    desc: Optional[str],
+    errors: Optional[dict],
+) -> list:
+    results = [None] * len(items)
+    futures = {executor.submit(func, item): i for i, item in enumerate(items)}
+    try:
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            disable=not verbose,
+            desc=desc,
+        ):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as error:
+                if errors is None:
+                    raise
+                errors[futures[future]] = error
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def parallel_map(
+    func: Callable[[Any], Any],
+    items: Iterable,
+    executor: ExecutorLike = None,
+    n_jobs: Optional[int] = -1,
+    prefer: Literal["threads", "processes"] = "threads",
+    client=None,
+    verbose: bool = False,
+    desc: Optional[str] = None,
+    salvage: bool = False,
+) -> list:
+    """Call `func` on each of `items` in parallel and return the results in order.
+
+    Parameters
+    ----------
+    func :
+        The function to call on each item.
+    items :
+        The items to call `func` on.
+    executor :
+        How to run the calls; see `set_executor`. If None, uses the executor set by
+        `set_executor`, or `prefer` if that is None too.
+    n_jobs :
+        The maximum number of calls to run at once. If 1, calls are made one at a time
+        in this thread. If -1 or None, uses the limit set by `set_max_in_flight` for
+        threads and the number of CPUs for processes. Ignored for a user-supplied
+        executor.
+    prefer :
+        The kind of pool to use when no executor is set: "threads" for work which
+        waits on the server, "processes" for work which needs the CPU.
+    client :
+        The `CAVEclient` which `func` uses. If provided, its connection pools are
+        enlarged to match the number of concurrent threads.
+    verbose :
+        Whether to display a progress bar.
+    desc :
+        Description for the progress bar.
+    salvage :
+        If False, the first error raised by `func` is raised as soon as it happens. If
+        True, the remaining calls are still made, and a `PartialResultError` holding
+        the results of the calls which succeeded is raised at the end.
+
+    Returns
+    -------
+    :
+        The result of `func` for each item, in the same order as `items`.
+    """
+    results, errors = _parallel_map(
+        func, items, executor, n_jobs, prefer, client, verbose, desc, salvage
+    )
+    if errors:
+        first_error = next(iter(errors.values()))
+        raise PartialResultError(
+            f"{len(errors)} of {len(results)} calls failed, first with: "
+            f"{first_error!r}",
+            results,
+            errors,
+        ) from first_error
+    return results
+
+
+def _parallel_map(
+    func, items, executor, n_jobs, prefer, client, verbose, desc, salvage
+) -> tuple[list, dict]:
+    errors = {} if salvage else None
+    items = list(items)
+    _check_executor(executor)
+    if executor is None:
+        executor = get_executor()
+    if executor is None:
+        executor = prefer
+
+    if isinstance(executor, Executor):
+        results = _run_on_executor(func, items, executor, verbose, desc, errors)
+        return results, errors
+
+    n_workers = min(_resolve_n_workers(n_jobs, executor), max(len(items), 1))
+    if executor == "serial" or n_workers == 1:
+        results = _run_serial(func, items, verbose, desc, errors)
+        return results, errors
+
+    if executor == "threads":
+        if client is not None:
+            _ensure_connection_pool(client, n_workers)
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            results = _run_on_executor(func, items, pool, verbose, desc, errors)
+        return results, errors
+
+    # loky pickles with cloudpickle, so closures can be sent to workers, and reuses
+    # its worker processes between calls
+    from joblib.externals.loky import get_reusable_executor
+
+    pool = get_reusable_executor(max_workers=n_workers)
+    results = _run_on_executor(func, items, pool, verbose, desc, errors)
+    return results, errors
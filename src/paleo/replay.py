@@ -1,14 +1,17 @@
-from typing import Optional, Union
+from collections import deque
+from collections.abc import ItemsView, Mapping, ValuesView
+from typing import Collection, Hashable, Literal, Optional, Union
 
 import networkx as nx
 import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm
 
-from .networkdelta import NetworkDelta
+from .csrgraph import CSRGraph
+from .networkdelta import NODE_DTYPE, NetworkDelta
 
 
-def apply_edit(graph: nx.Graph, networkdelta: NetworkDelta):
+def apply_edit(graph: Union[nx.Graph, CSRGraph], networkdelta: NetworkDelta):
     """Apply the edit described by the networkdelta to the graph."""
     removed_edges = networkdelta.removed_edges
     removed_nodes = networkdelta.removed_nodes
@@ -34,7 +37,7 @@ def find_anchor_node(graph, anchor_nodes):
 
 
 def resolve_edit(
-    graph: nx.Graph,
+    graph: Union[nx.Graph, CSRGraph],
     networkdelta: Optional[NetworkDelta],
     anchor_nodes: list,
 ):
@@ -43,47 +46,834 @@ def resolve_edit(
     if networkdelta is not None:
         apply_edit(graph, networkdelta)
     anchor_node = find_anchor_node(graph, anchor_nodes)
-    component = nx.node_connected_component(graph, anchor_node)
+    component = _node_connected_component(graph, anchor_node)
     return component
 
 
-def apply_edit_sequence(
-    graph: nx.Graph,
+def _node_connected_component(graph: Union[nx.Graph, CSRGraph], node) -> set:
+    if isinstance(graph, CSRGraph):
+        return graph.node_connected_component(node)
+    return nx.node_connected_component(graph, node)
+
+
+def _subgraph(
+    graph: Union[nx.Graph, CSRGraph], nodes: Collection
+) -> Union[nx.Graph, CSRGraph]:
+    if isinstance(graph, CSRGraph):
+        return graph.subgraph(nodes)
+    return graph.subgraph(nodes).copy()
+
+
+def _subgraph_edges(graph: Union[nx.Graph, CSRGraph], nodes: Collection) -> np.ndarray:
+    if isinstance(graph, CSRGraph):
+        return graph.subgraph(nodes).edges()
+    return _as_edge_array(graph.subgraph(nodes).edges)
+
+
+def _separate_components(
+    graph: Union[nx.Graph, CSRGraph], starts: Collection[Hashable]
+) -> tuple[list[set], set]:
+    """Search outward from each of `starts` in lockstep until at most one search is
+    still growing.
+
+    Searches which reach each other are merged. A search which runs out of nodes has
+    visited an entire connected component, and is returned as a finished piece. Since
+    all searches advance at the same rate, the work done is proportional to the size
+    of the pieces which get separated, not the size of the largest component.
+    """
+    if isinstance(graph, CSRGraph):
+        return graph.separate_components(starts)
+
+    owner = {}
+    parents = {}
+    queues = {}
+    members = {}
+    for search_id, start in enumerate(starts):
+        owner[start] = search_id
+        parents[search_id] = search_id
+        queues[search_id] = deque([start])
+        members[search_id] = [start]
+
+    def find(search_id):
+        root = search_id
+        while parents[root] != root:
+            root = parents[root]
+        while parents[search_id] != root:
+            parents[search_id], search_id = root, parents[search_id]
+        return root
+
+    def merge(search_id, other_id):
+        if len(members[search_id]) < len(members[other_id]):
+            search_id, other_id = other_id, search_id
+        parents[other_id] = search_id
+        queues[search_id].extend(queues.pop(other_id))
+        members[search_id].extend(members.pop(other_id))
+        active.discard(other_id)
+        return search_id
+
+    active = set(queues.keys())
+    pieces = []
+    while len(active) > 1:
+        for search_id in list(active):
+            if search_id not in active:
+                continue
+            queue = queues[search_id]
+            if len(queue) == 0:
+                active.remove(search_id)
+                del queues[search_id]
+                pieces.append(set(members.pop(search_id)))
+                continue
+            node = queue.popleft()
+            for neighbor in graph.neighbors(node):
+                other_id = owner.get(neighbor)
+                if other_id is None:
+                    owner[neighbor] = search_id
+                    queue.append(neighbor)
+                    members[search_id].append(neighbor)
+                else:
+                    other_id = find(other_id)
+                    if other_id != search_id:
+                        search_id = merge(search_id, other_id)
+                        queue = queues[search_id]
+
+    remaining = set(members.popitem()[1]) if len(members) > 0 else set()
+    return pieces, remaining
+
+
+def _edge_key(source, target) -> tuple:
+    return (source, target) if source <= target else (target, source)
+
+
+def _edge_set(edges: np.ndarray) -> set:
+    return {_edge_key(source, target) for source, target in edges}
+
+
+def _as_node_array(nodes: Collection) -> np.ndarray:
+    if len(nodes) == 0:
+        return np.empty(0, dtype=NODE_DTYPE)
+    return np.array(list(nodes), dtype=NODE_DTYPE)
+
+
+def _as_edge_array(edges: Collection) -> np.ndarray:
+    if len(edges) == 0:
+        return np.empty((0, 2), dtype=NODE_DTYPE)
+    return np.array(list(edges), dtype=NODE_DTYPE)
+
+
+def _empty_networkdelta() -> NetworkDelta:
+    return NetworkDelta(
+        _as_node_array(()), _as_node_array(()), _as_edge_array(()), _as_edge_array(())
+    )
+
+
+class ComponentTracker:
+    def __init__(
+        self,
+        graph: Union[nx.Graph, CSRGraph],
+        anchor_nodes: Union[list, pd.Index, np.ndarray, pd.Series],
+        track_edges: bool = False,
+    ):
+        """
+        Track the connected component containing an anchor node as edits are applied
+        to a graph.
+
+        Rather than searching the entire component after every edit, the tracker only
+        explores the graph around the nodes and edges touched by each `NetworkDelta`.
+        Splits are detected by searching from both sides of each removed edge at once,
+        so only the piece which gets cut off is visited; merges are detected by
+        searching outward from added edges which connect to the component.
+
+        Parameters
+        ----------
+        graph :
+            The graph to apply edits to. This graph is modified in place.
+        anchor_nodes :
+            Nodes that are on the object of interest, in order of preference. After
+            each edit, the component containing the first of these nodes that is in
+            the graph is tracked. If none of them are in the graph yet, the component
+            is empty until an edit adds one.
+        track_edges :
+            Whether to also report changes to the edges of the component after each
+            edit.
+        """
+        self.graph = graph
+        self.anchor_nodes = anchor_nodes
+        self.track_edges = track_edges
+        self.anchor_node = find_anchor_node(graph, anchor_nodes)
+        if self.anchor_node is None:
+            self.component = set()
+        else:
+            self.component = _node_connected_component(graph, self.anchor_node)
+
+    def apply(self, networkdelta: Optional[NetworkDelta]) -> NetworkDelta:
+        """Apply an edit to the graph and update the tracked component.
+
+        Parameters
+        ----------
+        networkdelta :
+            The edit to apply. If None, the graph is left unchanged.
+
+        Returns
+        -------
+        :
+            The change to the component caused by this edit. Changes to edges are only
+            included if `track_edges` is True.
+        """
+        if networkdelta is None:
+            if self.anchor_node is None:
+                raise ValueError("None of the anchor nodes are in the graph.")
+            return _empty_networkdelta()
+
+        inspection = self._inspect_edit(networkdelta)
+        apply_edit(self.graph, networkdelta)
+        return self._resolve_edit(networkdelta, *inspection)
+
+    def _inspect_edit(self, networkdelta: NetworkDelta) -> tuple[set, set, set]:
+        # must be called before the edit is applied to the graph
+        graph = self.graph
+        component = self.component
+        track_edges = self.track_edges
+
+        # find nodes on the component which lose a neighbor, since these are the only
+        # places where the component could be split
+        frontier = set()
+        removed_edges = set()
+        for node in networkdelta.removed_nodes:
+            if node in component:
+                for neighbor in graph.neighbors(node):
+                    frontier.add(neighbor)
+                    if track_edges:
+                        removed_edges.add(_edge_key(node, neighbor))
+        for source, target in networkdelta.removed_edges:
+            if source in component and graph.has_edge(source, target):
+                frontier.add(source)
+                frontier.add(target)
+                if track_edges:
+                    removed_edges.add(_edge_key(source, target))
+        new_edges = set()
+        if track_edges:
+            new_edges = {
+                _edge_key(source, target)
+                for source, target in networkdelta.added_edges
+                if not graph.has_edge(source, target)
+            }
+        return frontier, removed_edges, new_edges
+
+    def _resolve_edit(
+        self,
+        networkdelta: NetworkDelta,
+        frontier: set,
+        removed_edges: set,
+        new_edges: set,
+    ) -> NetworkDelta:
+        # must be called after the edit is applied to the graph
+        graph = self.graph
+        component = self.component
+        track_edges = self.track_edges
+
+        removed = set()
+        for node in networkdelta.removed_nodes:
+            if node in component:
+                component.remove(node)
+                removed.add(node)
+
+        anchor_node = find_anchor_node(graph, self.anchor_nodes)
+        if anchor_node is None:
+            raise ValueError("None of the anchor nodes are in the graph.")
+
+        # every node left in the component is still connected to one of these starts,
+        # so separating them tells us which pieces were cut off from the anchor
+        starts = {node for node in frontier if node in component}
+        starts.add(anchor_node)
+        if self.anchor_node in component:
+            starts.add(self.anchor_node)
+        self.anchor_node = anchor_node
+
+        pieces, remaining = _separate_components(graph, starts)
+        joined = set()
+        cut = set()
+        for piece in pieces:
+            if anchor_node in piece:
+                # the anchor ended up on a finished piece, which is the new component
+                joined = piece - component
+                cut = component - piece
+                component = piece
+                self.component = component
+                break
+        else:
+            for piece in pieces:
+                for node in piece:
+                    if node in component:
+                        component.remove(node)
+                        cut.add(node)
+
+            # anything the anchor's search found off of the old component is newly
+            # attached, as is anything reachable from an added edge on the component
+            joined = {node for node in remaining if node not in component}
+            component.update(joined)
+            queue = deque(joined)
+            for source, target in networkdelta.added_edges:
+                source_in = source in component
+                target_in = target in component
+                if source_in != target_in and graph.has_edge(source, target):
+                    node = target if source_in else source
+                    component.add(node)
+                    joined.add(node)
+                    queue.append(node)
+            while queue:
+                node = queue.popleft()
+                for neighbor in graph.neighbors(node):
+                    if neighbor not in component:
+                        component.add(neighbor)
+                        joined.add(neighbor)
+                        queue.append(neighbor)
+
+        added_edges = set()
+        if track_edges:
+            for source, target in new_edges:
+                if (
+                    source in component
+                    and target in component
+                    and graph.has_edge(source, target)
+                ):
+                    added_edges.add((source, target))
+            for node in joined:
+                for neighbor in graph.neighbors(node):
+                    added_edges.add(_edge_key(node, neighbor))
+            # pieces which were cut off keep their edges in the graph, except for any
+            # that this edit just added
+            for node in cut:
+                for neighbor in graph.neighbors(node):
+                    edge = _edge_key(node, neighbor)
+                    if edge not in new_edges:
+                        removed_edges.add(edge)
+        else:
+            removed_edges.clear()
+
+        return NetworkDelta(
+            _as_node_array(removed | cut),
+            _as_node_array(joined),
+            _as_edge_array(removed_edges),
+            _as_edge_array(added_edges),
+        )
+
+
+class MultiComponentTracker:
+    def __init__(
+        self,
+        graph: Union[nx.Graph, CSRGraph],
+        anchor_nodes_by_object: Mapping,
+        track_edges: bool = False,
+    ):
+        """
+        Track the connected components containing the anchor nodes of many objects at
+        once, as edits are applied to a shared graph.
+
+        Each edit is applied to the graph once, and only the objects whose component or
+        anchor nodes are touched by the edit are updated. Replaying a sequence of edits
+        therefore costs in proportion to the number of edits, rather than the number of
+        edits times the number of objects.
+
+        Parameters
+        ----------
+        graph :
+            The graph to apply edits to. This graph is modified in place.
+        anchor_nodes_by_object :
+            A mapping from object IDs to the anchor nodes for that object, in order of
+            preference. See `ComponentTracker`.
+        track_edges :
+            Whether to also report changes to the edges of each component after each
+            edit.
+        """
+        self.graph = graph
+        self.trackers = {
+            object_id: ComponentTracker(graph, anchor_nodes, track_edges=track_edges)
+            for object_id, anchor_nodes in anchor_nodes_by_object.items()
+        }
+
+        # indexes from nodes to the objects whose component or anchors include them,
+        # used to find the objects that an edit could affect
+        self._component_owners = {}
+        self._anchor_owners = {}
+        for object_id, tracker in self.trackers.items():
+            for node in tracker.component:
+                self._component_owners.setdefault(node, []).append(object_id)
+            for node in tracker.anchor_nodes:
+                self._anchor_owners.setdefault(node, []).append(object_id)
+
+    def apply(
+        self, networkdelta: Optional[NetworkDelta]
+    ) -> dict[Hashable, NetworkDelta]:
+        """Apply an edit to the graph and update the tracked components.
+
+        Parameters
+        ----------
+        networkdelta :
+            The edit to apply. If None, the graph is left unchanged.
+
+        Returns
+        -------
+        :
+            A dictionary mapping object IDs to the change to their component caused by
+            this edit. Objects which were not touched by the edit are not included.
+        """
+        if networkdelta is None:
+            return {
+                object_id: tracker.apply(None)
+                for object_id, tracker in self.trackers.items()
+            }
+
+        touched_nodes = set(networkdelta.removed_nodes)
+        touched_nodes.update(networkdelta.added_nodes)
+        touched_nodes.update(networkdelta.removed_edges.ravel())
+        touched_nodes.update(networkdelta.added_edges.ravel())
+        affected_objects = set()
+        for node in touched_nodes:
+            affected_objects.update(self._component_owners.get(node, ()))
+            affected_objects.update(self._anchor_owners.get(node, ()))
+
+        inspections = {
+            object_id: self.trackers[object_id]._inspect_edit(networkdelta)
+            for object_id in affected_objects
+        }
+        apply_edit(self.graph, networkdelta)
+
+        changes = {}
+        for object_id, inspection in inspections.items():
+            change = self.trackers[object_id]._resolve_edit(networkdelta, *inspection)
+            for node in change.removed_nodes:
+                owners = self._component_owners[node]
+                owners.remove(object_id)
+                if len(owners) == 0:
+                    del self._component_owners[node]
+            for node in change.added_nodes:
+                self._component_owners.setdefault(node, []).append(object_id)
+            changes[object_id] = change
+        return changes
+
+
+def _is_unchanged(change: NetworkDelta, with_edges: bool) -> bool:
+    if with_edges:
+        return change.is_empty
+    else:
+        return change.removed_nodes.size == 0 and change.added_nodes.size == 0
+
+
+def _apply_to_sets(
+    nodes: set, edges: set, networkdelta: NetworkDelta, with_edges: bool
+) -> None:
+    nodes.difference_update(networkdelta.removed_nodes)
+    nodes.update(networkdelta.added_nodes)
+    if with_edges:
+        edges.difference_update(_edge_set(networkdelta.removed_edges))
+        edges.update(_edge_set(networkdelta.added_edges))
+
+
+class _StateItemsView(ItemsView):
+    def __iter__(self):
+        yield from self._mapping._iter_states()
+
+
+class _StateValuesView(ValuesView):
+    def __iter__(self):
+        for _, state in self._mapping._iter_states():
+            yield state
+
+
+class StateHistory(Mapping):
+    def __init__(
+        self,
+        nodes: np.ndarray,
+        edges: np.ndarray,
+        deltas: dict[Hashable, NetworkDelta],
+        return_graphs: bool = False,
+        checkpoint_interval: Optional[int] = None,
+    ):
+        """
+        A compact record of the states of an object across a sequence of edits.
+
+        Only the first state is stored in full, along with the change from each state
+        to the next. States are rebuilt on demand when they are accessed, so holding a
+        long history costs memory in proportion to how much the object changed rather
+        than the number of states times the size of the object.
+
+        A `StateHistory` behaves like the dictionary returned by `apply_edit_sequence`:
+        indexing it with a state ID returns the graph (if `return_graphs` is True) or
+        the set of nodes at that state. Iterating over `items()` or `values()` rebuilds
+        states one after another, which is much cheaper than indexing each state.
+
+        Parameters
+        ----------
+        nodes :
+            Nodes of the object at the first state.
+        edges :
+            Edges of the object at the first state.
+        deltas :
+            A dictionary mapping each state ID, in order, to the change from the
+            previous state to that state. The change for the first state should be
+            empty.
+        return_graphs :
+            Whether indexing returns graphs rather than sets of nodes.
+        checkpoint_interval :
+            If provided, a full copy of every `checkpoint_interval`-th state is kept,
+            so that looking up a state only replays the changes since the nearest
+            checkpoint before it. Otherwise, states are rebuilt from the first state.
+        """
+        self.nodes = nodes
+        self.edges = edges
+        self.deltas = deltas
+        self.return_graphs = return_graphs
+        self.checkpoint_interval = checkpoint_interval
+
+        self._positions = {state_id: i for i, state_id in enumerate(deltas.keys())}
+        self._delta_list = list(deltas.values())
+        self._checkpoints = {0: (nodes, edges)}
+        if checkpoint_interval is not None:
+            if checkpoint_interval < 1:
+                raise ValueError("`checkpoint_interval` must be a positive integer.")
+            node_set = set(nodes)
+            edge_set = _edge_set(edges) if return_graphs else set()
+            for position, delta in enumerate(self._delta_list):
+                _apply_to_sets(node_set, edge_set, delta, return_graphs)
+                if position > 0 and position % checkpoint_interval == 0:
+                    self._checkpoints[position] = (
+                        _as_node_array(node_set),
+                        _as_edge_array(edge_set),
+                    )
+
+    @classmethod
+    def from_edits(
+        cls,
+        graph: Union[nx.Graph, CSRGraph],
+        edits: dict,
+        anchor_nodes: Union[list, pd.Index, np.ndarray, pd.Series],
+        return_graphs: bool = False,
+        include_initial: bool = True,
+        remove_unchanged: bool = False,
+        checkpoint_interval: Optional[int] = 100,
+        verbose: bool = True,
+    ) -> "StateHistory":
+        """Replay a sequence of edits once and record the history of the object.
+
+        See `apply_edit_sequence` for a description of the parameters. With the default
+        `checkpoint_interval`, looking up any state with `state_at` replays at most 100
+        changes.
+        """
+        history = apply_edit_sequence(
+            graph,
+            edits,
+            anchor_nodes,
+            return_graphs=return_graphs,
+            include_initial=include_initial,
+            remove_unchanged=remove_unchanged,
+            verbose=verbose,
+            return_as="history",
+        )
+        return cls(
+            history.nodes,
+            history.edges,
+            history.deltas,
+            return_graphs=return_graphs,
+            checkpoint_interval=checkpoint_interval,
+        )
+
+    def __repr__(self):
+        return (
+            f"StateHistory(n_states={len(self)}, n_initial_nodes={len(self.nodes)}, "
+            f"n_checkpoints={len(self._checkpoints)}, nbytes={self.nbytes})"
+        )
+
+    def __getitem__(self, state_id: Hashable) -> Union[frozenset, nx.Graph]:
+        return self.state_at(state_id)
+
+    def __iter__(self):
+        return iter(self.deltas)
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def items(self) -> ItemsView:
+        return _StateItemsView(self)
+
+    def values(self) -> ValuesView:
+        return _StateValuesView(self)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the arrays describing this history."""
+        nbytes = 0
+        for nodes, edges in self._checkpoints.values():
+            nbytes += nodes.nbytes + edges.nbytes
+        for delta in self._delta_list:
+            nbytes += delta.removed_nodes.nbytes + delta.added_nodes.nbytes
+            nbytes += delta.removed_edges.nbytes + delta.added_edges.nbytes
+        return nbytes
+
+    def _sets_at(self, state_id: Hashable, with_edges: bool) -> tuple[set, set]:
+        position = self._positions[state_id]
+        if self.checkpoint_interval is None:
+            start = 0
+        else:
+            start = position - position % self.checkpoint_interval
+        nodes, edges = self._checkpoints[start]
+        node_set = set(nodes)
+        edge_set = _edge_set(edges) if with_edges else set()
+        for delta in self._delta_list[start + 1 : position + 1]:
+            _apply_to_sets(node_set, edge_set, delta, with_edges)
+        return node_set, edge_set
+
+    def state_at(self, state_id: Hashable) -> Union[frozenset, nx.Graph]:
+        """Rebuild the object at a given state.
+
+        Parameters
+        ----------
+        state_id :
+            The ID of the state, usually the operation ID of the last edit applied.
+
+        Returns
+        -------
+        :
+            The graph of the object (if `return_graphs` is True) or its set of nodes.
+        """
+        if self.return_graphs:
+            return self.graph_at(state_id)
+        else:
+            return self.nodes_at(state_id)
+
+    def nodes_at(self, state_id: Hashable) -> frozenset:
+        """Rebuild the set of nodes in the object at a given state."""
+        node_set, _ = self._sets_at(state_id, with_edges=False)
+        return frozenset(node_set)
+
+    def graph_at(self, state_id: Hashable) -> nx.Graph:
+        """Rebuild the graph of the object at a given state."""
+        if not self.return_graphs:
+            raise ValueError("This history was recorded without edges.")
+        node_set, edge_set = self._sets_at(state_id, with_edges=True)
+        graph = nx.Graph()
+        graph.add_nodes_from(node_set)
+        graph.add_edges_from(edge_set)
+        return graph
+
+    def _iter_states(self):
+        if self.return_graphs:
+            graph = nx.Graph()
+            graph.add_nodes_from(self.nodes)
+            graph.add_edges_from(self.edges)
+            for state_id, delta in self.deltas.items():
+                apply_edit(graph, delta)
+                yield state_id, graph.copy()
+        else:
+            nodes = set(self.nodes)
+            for state_id, delta in self.deltas.items():
+                nodes.difference_update(delta.removed_nodes)
+                nodes.update(delta.added_nodes)
+                yield state_id, frozenset(nodes)
+
+
+def _replay_edits(
+    graph: Union[nx.Graph, CSRGraph],
     edits: dict,
-    anchor_nodes: Union[list, pd.Index, np.ndarray, pd.Series],
-    return_graphs: bool = False,
-    include_initial: bool = True,
-    remove_unchanged: bool = False,
-    verbose: bool = True,
-) -> Union[dict, tuple[dict, dict]]:
-    """Apply a sequence of edits to the graph in order, storing information about
-    intermediate states."""
+    anchor_nodes_by_object: Mapping,
+    include_initial: bool,
+    track_edges: bool,
+    verbose: bool,
+):
     graph = graph.copy()
     if include_initial and -1 not in edits:
         edits = {-1: None, **edits}
 
-    out = {}
+    tracker = MultiComponentTracker(
+        graph, anchor_nodes_by_object, track_edges=track_edges
+    )
     for edit_id, edit in tqdm(
         edits.items(), disable=not verbose, desc="Applying edits"
     ):
-        component = resolve_edit(graph, edit, anchor_nodes)
-        if return_graphs:
-            out[edit_id] = graph.subgraph(component).copy()
-        else:
-            out[edit_id] = component
-
-    if remove_unchanged:
-        last = list(out.values())[0]
-        for edit_id, current in list(out.items())[1:]:
-            if return_graphs:
-                if nx.utils.graphs_equal(last, current):
-                    del out[edit_id]
-                else:
-                    last = current
+        yield edit_id, tracker, tracker.apply(edit)
+
+
+def iter_edit_sequence(
+    graph: Union[nx.Graph, CSRGraph],
+    edits: dict,
+    anchor_nodes: Union[list, pd.Index, np.ndarray, pd.Series, Mapping],
+    return_graphs: bool = False,
+    include_initial: bool = True,
+    remove_unchanged: bool = False,
+    verbose: bool = True,
+):
+    """Apply a sequence of edits to the graph in order, yielding each state as it is
+    reached.
+
+    This is the lazy counterpart to `apply_edit_sequence`: states are produced one at
+    a time, so a pipeline which reduces each state (e.g. to a node count) and then
+    discards it uses memory independent of the number of edits. See
+    `apply_edit_sequence` for a description of the parameters.
+
+    Yields
+    ------
+    :
+        The edit ID.
+    :
+        The component (or its graph) after that edit. If `anchor_nodes` is a mapping,
+        a dictionary mapping object IDs to their component instead; with
+        `remove_unchanged`, only objects which changed are included, and edits which
+        changed no objects are skipped.
+    """
+    if isinstance(anchor_nodes, Mapping):
+        anchor_nodes_by_object = anchor_nodes
+    else:
+        anchor_nodes_by_object = {None: anchor_nodes}
+
+    # edges are tracked whenever graphs are requested, so that a state can be
+    # recognized as unchanged from the edit alone
+    unchanged = _empty_networkdelta()
+    current_states = {}
+    for edit_id, tracker, changes in _replay_edits(
+        graph,
+        edits,
+        anchor_nodes_by_object,
+        include_initial=include_initial,
+        track_edges=return_graphs,
+        verbose=verbose,
+    ):
+        states = {}
+        for object_id, object_tracker in tracker.trackers.items():
+            if object_id in current_states:
+                change = changes.get(object_id, unchanged)
+                is_changed = not _is_unchanged(change, return_graphs)
+                if remove_unchanged and not is_changed:
+                    continue
             else:
-                if set(last) == set(current):
-                    del out[edit_id]
+                is_changed = True
+
+            if is_changed:
+                component = object_tracker.component
+                if return_graphs:
+                    current_states[object_id] = _subgraph(tracker.graph, component)
                 else:
-                    last = current
+                    current_states[object_id] = frozenset(component)
+            states[object_id] = current_states[object_id]
+
+        if isinstance(anchor_nodes, Mapping):
+            if len(states) > 0:
+                yield edit_id, states
+        elif None in states:
+            yield edit_id, states[None]
+
+
+def apply_edit_sequence(
+    graph: Union[nx.Graph, CSRGraph],
+    edits: dict,
+    anchor_nodes: Union[list, pd.Index, np.ndarray, pd.Series, Mapping],
+    return_graphs: bool = False,
+    include_initial: bool = True,
+    remove_unchanged: bool = False,
+    verbose: bool = True,
+    return_as: Literal["dict", "history"] = "dict",
+) -> Union[dict, StateHistory]:
+    """Apply a sequence of edits to the graph in order, storing information about
+    intermediate states.
+
+    The component containing the anchor node is maintained incrementally using a
+    `ComponentTracker`, so each edit costs roughly in proportion to the size of its
+    `NetworkDelta` rather than the size of the component. Whether the component
+    changed is also known from each edit, so unchanged states are never rebuilt:
+    components are returned as `frozenset`s, and states where the component (or its
+    graph) did not change share the same object as the state before them. To process
+    states one at a time without holding all of them, use `iter_edit_sequence`.
+
+    Parameters
+    ----------
+    graph :
+        The initial graph, either a `networkx.Graph` or a `CSRGraph`. This graph is
+        not modified. If a `CSRGraph` is given, graphs of each state are also returned
+        as `CSRGraph`s.
+    edits :
+        A dictionary mapping edit IDs to `NetworkDelta`s, in the order to apply them.
+    anchor_nodes :
+        Nodes that are on the object of interest, in order of preference, used to pick
+        the connected component to consider at each state. Can also be a mapping from
+        object IDs to anchor nodes, in which case every object is followed through the
+        same pass over the edits, and the output is a dictionary with one result per
+        object.
+    return_graphs :
+        Whether to return the graph of the component at each state, rather than just
+        its nodes.
+    include_initial :
+        Whether to include the state before any edits, under the ID -1.
+    remove_unchanged :
+        Whether to remove states which are the same as the state before them.
+    verbose :
+        Whether to display a progress bar.
+    return_as :
+        Either "dict" to return a dictionary mapping each state ID to its component,
+        or "history" to return a `StateHistory`, which stores only the changes between
+        states and rebuilds each state on demand.
+
+    Returns
+    -------
+    :
+        The component (or its graph) at each state. If `anchor_nodes` is a mapping,
+        a dictionary mapping each object ID to this output for that object.
+    """
+    if return_as not in ["dict", "history"]:
+        raise ValueError(f"`return_as` must be 'dict' or 'history', got {return_as}")
+
+    if isinstance(anchor_nodes, Mapping):
+        anchor_nodes_by_object = anchor_nodes
+    else:
+        anchor_nodes_by_object = {None: anchor_nodes}
+    out = {object_id: {} for object_id in anchor_nodes_by_object.keys()}
+
+    if return_as == "dict":
+        for edit_id, states in iter_edit_sequence(
+            graph,
+            edits,
+            anchor_nodes_by_object,
+            return_graphs=return_graphs,
+            include_initial=include_initial,
+            remove_unchanged=remove_unchanged,
+            verbose=verbose,
+        ):
+            for object_id, state in states.items():
+                out[object_id][edit_id] = state
+    else:
+        unchanged = _empty_networkdelta()
+        initial_states = {}
+        for edit_id, tracker, changes in _replay_edits(
+            graph,
+            edits,
+            anchor_nodes_by_object,
+            include_initial=include_initial,
+            track_edges=return_graphs,
+            verbose=verbose,
+        ):
+            for object_id, object_tracker in tracker.trackers.items():
+                if object_id in initial_states:
+                    change = changes.get(object_id, unchanged)
+                    if remove_unchanged and _is_unchanged(change, return_graphs):
+                        continue
+                else:
+                    component = object_tracker.component
+                    nodes = _as_node_array(component)
+                    if return_graphs:
+                        edges = _subgraph_edges(tracker.graph, component)
+                    else:
+                        edges = _as_edge_array(())
+                    initial_states[object_id] = (nodes, edges)
+                    change = unchanged
+                out[object_id][edit_id] = change
+
+        out = {
+            object_id: StateHistory(
+                *initial_states[object_id],
+                deltas,
+                return_graphs=return_graphs,
+            )
+            for object_id, deltas in out.items()
+        }
 
-    return out
+    if isinstance(anchor_nodes, Mapping):
+        return out
+    else:
+        return out[None]
@@ -0,0 +1,342 @@
+import copy
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Collection, Optional
+
+import numpy as np
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+DEFAULT_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# `level2_chunk_graph` fails with a server error for roots made of a single level2
+# node, which is handled by falling back to `get_leaves`, so it is not retried
+DEFAULT_NO_RETRY_STATUS_CODES = {"chunkedgraph.level2_chunk_graph": (500,)}
+
+# read-only methods which workers often call with the same arguments at once
+DEFAULT_COALESCED_METHODS = (
+    "chunkedgraph.get_roots",
+    "chunkedgraph.get_root_timestamps",
+    "chunkedgraph.get_leaves",
+    "chunkedgraph.level2_chunk_graph",
+    "chunkedgraph.get_lineage_graph",
+    "chunkedgraph.get_past_ids",
+    "chunkedgraph.get_operation_details",
+    "l2cache.get_l2data",
+)
+
+_SERVICES = ("chunkedgraph", "l2cache", "materialize", "info")
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        retry_status_codes: tuple[int, ...] = DEFAULT_RETRY_STATUS_CODES,
+        no_retry_status_codes: Optional[dict[str, tuple[int, ...]]] = None,
+        coalesced_methods: Collection[str] = DEFAULT_COALESCED_METHODS,
+        seed: Optional[int] = None,
+    ):
+        """
+        Rate limits and retries the requests that paleo makes to CAVE services.
+
+        Requests are only sent while a token bucket holding up to `burst` tokens,
+        refilled at `rate` tokens per second, has a token to spend. A request which
+        fails with one of `retry_status_codes`, or with a connection error or timeout,
+        is retried up to `max_retries` times after a jittered, exponentially growing
+        delay. For a 429 response with a `Retry-After` header, that delay is used
+        instead.
+
+        A call to one of `coalesced_methods` made while an identical call is still in
+        flight waits for that call and shares its result, rather than sending the same
+        request again.
+
+        The bucket and the calls in flight are shared by all threads in a process; each
+        worker process has its own. `stats` counts the requests sent, retries, failures,
+        waits for the rate limit, and calls saved by coalescing ("coalesced").
+
+        Parameters
+        ----------
+        rate :
+            Maximum sustained number of requests per second. If None, requests are not
+            rate limited.
+        burst :
+            Maximum number of requests sent at once after a quiet period. Defaults to
+            `rate`, rounded up.
+        max_retries :
+            Maximum number of times to retry a failed request.
+        backoff :
+            Delay in seconds before the first retry, doubled for each retry after.
+        max_backoff :
+            Maximum delay in seconds between retries.
+        retry_status_codes :
+            HTTP status codes which are retried.
+        no_retry_status_codes :
+            Status codes which are not retried for specific methods, keyed by names like
+            "chunkedgraph.level2_chunk_graph". Defaults to
+            `DEFAULT_NO_RETRY_STATUS_CODES`.
+        coalesced_methods :
+            Names of the methods whose identical concurrent calls are coalesced, like
+            "chunkedgraph.get_roots". Only methods which do not change anything on the
+            server should be listed.
+        seed :
+            Seed for the jitter.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("`rate` must be positive.")
+        self.rate = rate
+        if burst is None and rate is not None:
+            burst = max(int(-(-rate // 1)), 1)
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_status_codes = tuple(retry_status_codes)
+        if no_retry_status_codes is None:
+            no_retry_status_codes = DEFAULT_NO_RETRY_STATUS_CODES
+        self.no_retry_status_codes = dict(no_retry_status_codes)
+        self.coalesced_methods = frozenset(coalesced_methods)
+        self.stats = Counter()
+
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._tokens = float(burst) if burst is not None else 0.0
+        self._last_refill = time.monotonic()
+        self._in_flight = {}
+
+    def __repr__(self):
+        return (
+            f"RequestScheduler(rate={self.rate}, burst={self.burst}, "
+            f"max_retries={self.max_retries}, backoff={self.backoff}, "
+            f"max_backoff={self.max_backoff})"
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["stats"] = Counter()
+        state["_in_flight"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._last_refill = time.monotonic()
+
+    def _acquire(self) -> None:
+        if self.rate is None:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.stats["rate_limited"] += 1
+            time.sleep(wait)
+
+    def _should_retry(self, name: str, error: Exception) -> bool:
+        if isinstance(error, (ConnectionError, Timeout)):
+            return True
+        if not isinstance(error, HTTPError):
+            return False
+        status_code = getattr(error.response, "status_code", None)
+        if status_code is None:
+            return False
+        if status_code in self.no_retry_status_codes.get(name, ()):
+            return False
+        return status_code in self.retry_status_codes
+
+    def _delay(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        if response is not None and response.status_code == 429:
+            try:
+                return min(float(response.headers["Retry-After"]), self.max_backoff)
+            except (KeyError, TypeError, ValueError):
+                pass
+        delay = min(self.backoff * 2**attempt, self.max_backoff)
+        with self._lock:
+            jitter = self._rng.uniform(0.5, 1.5)
+        return delay * jitter
+
+    def call(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        """Call `func` with `args` and `kwargs` under this scheduler's rate limit,
+        retrying failures which are likely to be transient.
+
+        Parameters
+        ----------
+        name :
+            Name of the method being called, like "chunkedgraph.get_roots", used to look
+            up `no_retry_status_codes`.
+        func :
+            The function making the request.
+        """
+        key = None
+        if name in self.coalesced_methods:
+            key = _coalesce_key(name, args, kwargs)
+        if key is None:
+            return self._call(name, func, args, kwargs)
+
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            is_leader = in_flight is None
+            if is_leader:
+                # the future for the result, and the number of callers waiting on it
+                in_flight = [Future(), 0]
+                self._in_flight[key] = in_flight
+            else:
+                in_flight[1] += 1
+                self.stats["coalesced"] += 1
+        future = in_flight[0]
+        if not is_leader:
+            # every caller gets its own deep copy of a snapshot taken before the first
+            # caller could modify its result in place
+            return copy.deepcopy(future.result())
+
+        try:
+            result = self._call(name, func, args, kwargs)
+        except BaseException as error:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        # no more callers can join once the call is no longer in flight, so the
+        # snapshot is only needed if some already have
+        if in_flight[1] > 0:
+            future.set_result(copy.deepcopy(result))
+        else:
+            future.set_result(None)
+        return result
+
+    def _call(self, name: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+        attempt = 0
+        while True:
+            self._acquire()
+            with self._lock:
+                self.stats["requests"] += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as error:
+                if attempt >= self.max_retries or not self._should_retry(name, error):
+                    with self._lock:
+                        self.stats["failures"] += 1
+                    raise
+                delay = self._delay(attempt, error)
+                with self._lock:
+                    self.stats["retries"] += 1
+            time.sleep(delay)
+            attempt += 1
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    hash(value)
+    return value
+
+
+def _coalesce_key(name: str, args: tuple, kwargs: dict) -> Optional[tuple]:
+    """Make a hashable key identifying a call, or None if its arguments cannot be
+    compared."""
+    try:
+        return (name, _freeze(args), _freeze(kwargs))
+    except TypeError:
+        return None
+
+
+_REQUEST_SCHEDULER = RequestScheduler()
+
+
+def set_request_scheduler(
+    scheduler: Optional[RequestScheduler],
+) -> Optional[RequestScheduler]:
+    """Set the scheduler which all of paleo's requests go through.
+
+    Parameters
+    ----------
+    scheduler :
+        The scheduler to use. If None, requests are sent directly, without rate
+        limiting or retries.
+
+    Returns
+    -------
+    :
+        The scheduler that was set.
+    """
+    global _REQUEST_SCHEDULER
+    _REQUEST_SCHEDULER = scheduler
+    return scheduler
+
+
+def get_request_scheduler() -> Optional[RequestScheduler]:
+    """Get the scheduler set by `set_request_scheduler`."""
+    return _REQUEST_SCHEDULER
+
+
+class _ScheduledService:
+    def __init__(self, service, name: str, scheduler: RequestScheduler):
+        self._service = service
+        self._name = name
+        self._scheduler = scheduler
+
+    def __getattr__(self, name: str) -> Any:
+        # guards against recursion while unpickling, before these are set
+        if name in ("_service", "_name", "_scheduler"):
+            raise AttributeError(name)
+        value = getattr(self._service, name)
+        if name.startswith("_") or not callable(value):
+            return value
+        qualname = f"{self._name}.{name}"
+        scheduler = self._scheduler
+
+        def scheduled(*args, **kwargs):
+            return scheduler.call(qualname, value, *args, **kwargs)
+
+        return scheduled
+
+
+class _ScheduledClient:
+    def __init__(self, client, scheduler: RequestScheduler):
+        self._client = client
+        self._scheduler = scheduler
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("_client", "_scheduler"):
+            raise AttributeError(name)
+        value = getattr(self._client, name)
+        if name in _SERVICES:
+            return _ScheduledService(value, name, self._scheduler)
+        return value
+
+
+def schedule_client(client, scheduler: Optional[RequestScheduler] = None):
+    """Wrap a `CAVEclient` so that calls through its `chunkedgraph`, `l2cache`,
+    `materialize` and `info` services go through `scheduler`, or the scheduler set by
+    `set_request_scheduler` if None. A client which is already wrapped, or None, is
+    returned as is."""
+    if client is None or isinstance(client, _ScheduledClient):
+        return client
+    if scheduler is None:
+        scheduler = get_request_scheduler()
+    if scheduler is None:
+        return client
+    return _ScheduledClient(client, scheduler)
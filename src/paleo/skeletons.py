@@ -4,12 +4,12 @@ import networkx as nx
 import numpy as np
 import pandas as pd
 from caveclient import CAVEclient
-from joblib import Parallel, delayed
-from tqdm.auto import tqdm
-from tqdm_joblib import tqdm_joblib
 
+from .csrgraph import _as_networkx
 from .graph_edits import compare_graphs
 from .networkdelta import NetworkDelta
+from .parallel import ExecutorLike, parallel_map
+from .scheduler import schedule_client
 from .utils import get_nucleus_location
 
 
@@ -23,6 +23,7 @@ def skeletonize_sequence(
     return_as: Literal["meshparty", "arrays", "networkx"] = "meshparty",
     n_jobs: int = -1,
     verbose: bool = True,
+    executor: ExecutorLike = None,
 ):
     """Generate skeletons for a sequence of graphs.
 
@@ -48,11 +49,15 @@ def skeletonize_sequence(
         The format to return the skeletons in. Options are "meshparty", "arrays", and
         "networkx".
     n_jobs :
-        The number of jobs to run in parallel. See joblib.Parallel for more details.
+        The number of states to skeletonize at once. If -1, uses all CPUs.
     verbose :
         Whether to display progress bars.
+    executor :
+        How to skeletonize states in parallel; see `set_executor`. If None, uses the
+        executor set by `set_executor`, or processes if none is set.
     """
 
+    client = schedule_client(client)
     try:
         from pcg_skel import pcg_skeleton_direct
     except (ImportError, ModuleNotFoundError):
@@ -75,6 +80,7 @@ def skeletonize_sequence(
         root_point = get_nucleus_location(root_id, client)
 
     def _skeletonize_state(graph):
+        graph = _as_networkx(graph)
         node_ids = pd.Index(list(graph.nodes()))
         vertices = level2_data.loc[
             node_ids, ["rep_coord_nm_x", "rep_coord_nm_y", "rep_coord_nm_z"]
@@ -89,23 +95,15 @@ def skeletonize_sequence(
         mapping = dict(zip(node_ids, skeleton.mesh_to_skel_map.tolist()))
         return skeleton, mapping
 
-    if n_jobs != 1:
-        with tqdm_joblib(
-            desc="Skeletonizing states", disable=not verbose, total=len(graphs_by_state)
-        ):
-            results = Parallel(n_jobs=n_jobs)(
-                delayed(_skeletonize_state)(graph) for graph in graphs_by_state.values()
-            )
-    else:
-        results = [
-            _skeletonize_state(graph)
-            for graph in tqdm(
-                graphs_by_state.values(),
-                desc="Skeletonizing states",
-                disable=not verbose,
-                total=len(graphs_by_state),
-            )
-        ]
+    results = parallel_map(
+        _skeletonize_state,
+        graphs_by_state.values(),
+        executor=executor,
+        n_jobs=n_jobs,
+        prefer="processes",
+        verbose=verbose,
+        desc="Skeletonizing states",
+    )
 
     if remove_unchanged:
         keep_state = check_skeleton_changes(
@@ -0,0 +1,247 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from caveclient import CAVEclient
+from tqdm.auto import tqdm
+
+from .cache import Level2Cache, get_level2_cache
+from .graph_edits import (
+    DEFAULT_RADIUS,
+    Radius,
+    _get_change_log_operations,
+    _get_level2_edits_from_points,
+    _get_tabular_change_log,
+    _join_operation_details,
+)
+from .networkdelta import NetworkDelta
+from .parallel import ExecutorLike, PartialResultError
+from .scheduler import schedule_client
+from .types import Integer
+
+SETTINGS_FILE = "store.json"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, suffix=".tmp", delete=False
+    ) as f:
+        f.write(text)
+    os.replace(f.name, path)
+
+
+class DeltaStore:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        radius: Radius = DEFAULT_RADIUS,
+        metadata: bool = False,
+    ):
+        """
+        A persistent store of level2 edits, keyed by operation ID.
+
+        Operations are immutable, so once the changes from an operation have been
+        extracted they never need to be extracted again. `update` extracts only the
+        operations on a root which are not in the store yet. Each operation is written
+        to its own file as soon as it is extracted, so an interrupted update resumes
+        where it stopped.
+
+        Parameters
+        ----------
+        path :
+            Directory to store the edits in. Created if it does not exist.
+        radius :
+            The radius of the bounding box used to extract edits; see
+            `get_root_level2_edits`. Fixed when the store is created, since edits
+            extracted with different radii are not comparable.
+        metadata :
+            Whether to include metadata about the changes in extracted edits.
+        """
+        self.path = Path(path)
+        self._deltas_path = self.path / "deltas"
+        self._deltas_path.mkdir(parents=True, exist_ok=True)
+
+        settings_path = self.path / SETTINGS_FILE
+        settings = {"radius": radius, "metadata": metadata}
+        if settings_path.exists():
+            with open(settings_path) as f:
+                stored_settings = json.load(f)
+            for key, value in settings.items():
+                if stored_settings[key] != value:
+                    raise ValueError(
+                        f"Store at {self.path} was created with {key}="
+                        f"{stored_settings[key]!r}, got {value!r}"
+                    )
+            settings = stored_settings
+        else:
+            settings["datastack"] = None
+            _write_atomic(settings_path, json.dumps(settings))
+        self.radius = settings["radius"]
+        self.metadata = settings["metadata"]
+        self.datastack = settings.get("datastack")
+
+    def __repr__(self):
+        return (
+            f"DeltaStore(path={str(self.path)!r}, radius={self.radius!r}, "
+            f"metadata={self.metadata}, n_operations={len(self)})"
+        )
+
+    def _delta_path(self, operation_id: Integer) -> Path:
+        return self._deltas_path / f"{int(operation_id)}.json"
+
+    def __contains__(self, operation_id: Integer) -> bool:
+        return self._delta_path(operation_id).exists()
+
+    def __iter__(self) -> Iterator[int]:
+        for entry in os.scandir(self._deltas_path):
+            if entry.name.endswith(".json"):
+                yield int(entry.name[: -len(".json")])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getitem__(self, operation_id: Integer) -> NetworkDelta:
+        try:
+            with open(self._delta_path(operation_id)) as f:
+                return NetworkDelta.from_dict(json.load(f))
+        except FileNotFoundError:
+            raise KeyError(operation_id)
+
+    def __setitem__(self, operation_id: Integer, networkdelta: NetworkDelta) -> None:
+        _write_atomic(self._delta_path(operation_id), networkdelta.to_json())
+
+    def get(
+        self, operation_id: Integer, default: Optional[NetworkDelta] = None
+    ) -> Optional[NetworkDelta]:
+        """Get the edit for an operation, or `default` if it is not in the store."""
+        try:
+            return self[operation_id]
+        except KeyError:
+            return default
+
+    def load(
+        self, operation_ids: Optional[list[Integer]] = None
+    ) -> dict[int, NetworkDelta]:
+        """Load the edits for `operation_ids`, in order, or for every operation in the
+        store if None."""
+        if operation_ids is None:
+            operation_ids = sorted(self)
+        return {int(operation_id): self[operation_id] for operation_id in operation_ids}
+
+    def _check_datastack(self, client: CAVEclient) -> None:
+        datastack = getattr(client, "datastack_name", None)
+        if self.datastack is None and datastack is not None:
+            self.datastack = datastack
+            with open(self.path / SETTINGS_FILE) as f:
+                settings = json.load(f)
+            settings["datastack"] = datastack
+            _write_atomic(self.path / SETTINGS_FILE, json.dumps(settings))
+        elif datastack is not None and datastack != self.datastack:
+            raise ValueError(
+                f"Store at {self.path} holds edits from datastack {self.datastack!r}, "
+                f"but the client is for {datastack!r}"
+            )
+
+    def update(
+        self,
+        root_id: Integer,
+        client: CAVEclient,
+        filtered: bool = False,
+        batch_size: int = 100,
+        n_jobs: int = -1,
+        verbose: bool = True,
+        cache: Optional[Level2Cache] = None,
+        max_bounds_expansion: Optional[float] = None,
+        executor: ExecutorLike = None,
+    ) -> dict[int, NetworkDelta]:
+        """Extract the changes to the level2 graph for all operations on a root which
+        are not in the store yet, and return the changes for every operation on it.
+
+        Parameters
+        ----------
+        root_id :
+            The root ID to extract changes for.
+        client :
+            The CAVEclient instance to use.
+        filtered :
+            Whether to filter the change log to only include changes which affect the
+            final state of the root ID.
+        batch_size :
+            The number of operations to extract before writing them to the store.
+        n_jobs :
+            The number of requests to run concurrently. If -1, uses the limit set by
+            `set_max_in_flight`.
+        verbose :
+            Whether to display a progress bar.
+        cache :
+            Cache for level2 graph fetches. If None, the cache set by
+            `set_level2_cache` is used, if any.
+        max_bounds_expansion :
+            See `get_root_level2_edits`.
+        executor :
+            How to run requests in parallel; see `set_executor`.
+
+        Returns
+        -------
+        :
+            The changes to the level2 graph from each operation on the root, in the
+            order they happened.
+
+        Raises
+        ------
+        PartialResultError
+            If some operations failed even after retrying. The other operations are
+            still written to the store, and its `results` holds every operation on the
+            root which is in the store.
+        """
+        self._check_datastack(client)
+        client = schedule_client(client)
+        if cache is None:
+            cache = get_level2_cache()
+
+        # only the operations which are missing need their details looked up
+        change_log = _get_tabular_change_log(root_id, client, filtered=filtered)
+        operation_ids = change_log.index.to_list()
+        missing = change_log.loc[[op not in self for op in operation_ids]]
+        errors = {}
+
+        with tqdm(
+            total=len(missing), disable=not verbose, desc="Extracting operations"
+        ) as progress:
+            for start in range(0, len(missing), batch_size):
+                batch = _join_operation_details(
+                    missing.iloc[start : start + batch_size],
+                    client,
+                    n_jobs=n_jobs,
+                    executor=executor,
+                )
+                try:
+                    networkdeltas = _get_level2_edits_from_points(
+                        _get_change_log_operations(batch, self.radius),
+                        client,
+                        radius=self.radius,
+                        metadata=self.metadata,
+                        n_jobs=n_jobs,
+                        verbose=False,
+                        cache=cache,
+                        max_bounds_expansion=max_bounds_expansion,
+                        executor=executor,
+                    )
+                except PartialResultError as error:
+                    networkdeltas = error.results
+                    errors.update(error.errors)
+                for operation_id, networkdelta in networkdeltas.items():
+                    self[operation_id] = networkdelta
+                progress.update(len(batch))
+
+        if len(errors) > 0:
+            first_error = next(iter(errors.values()))
+            raise PartialResultError(
+                f"Failed to extract {len(errors)} of {len(missing)} operations, "
+                f"first with: {first_error!r}",
+                self.load([op for op in operation_ids if op in self]),
+                errors,
+            ) from first_error
+        return self.load(operation_ids)
@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm
 
+from .scheduler import schedule_client
 from .utils import get_supervoxel_mappings
 
 
@@ -17,6 +18,7 @@ def get_mutable_synapses(
     remove_self=True,
     verbose=False,
     n_jobs=-1,
+    executor=None,
 ):
     """Get all synapses that could have been part of this `root_id` across all states."""
     # TODO is it worth parallelizing this function?
@@ -24,6 +26,7 @@ def get_mutable_synapses(
     # TODO could also be sped up by taking the union of L2 IDS that get used, then
     # doing a current get_roots on those, feeding that into synapse query
 
+    client = schedule_client(client)
     if synapse_table is None:
         synapse_table = client.info.get_datastack_info()["synapse_table"]
 
@@ -74,7 +77,7 @@ def get_mutable_synapses(
         all_supervoxel_ids.append(table[f"{side}_pt_supervoxel_id"].unique())
     supervoxel_ids = np.unique(np.concatenate(all_supervoxel_ids))
     supervoxel_mappings = get_supervoxel_mappings(
-        supervoxel_ids, edits, client, n_jobs=n_jobs
+        supervoxel_ids, edits, client, n_jobs=n_jobs, executor=executor
     )
 
     exploded_tables = []
@@ -1,15 +1,21 @@
+from collections.abc import Mapping
 from typing import Optional, Union
 
+import networkx as nx
 import numpy as np
 import pandas as pd
 from caveclient import CAVEclient
-from joblib import Parallel, delayed
 from requests.exceptions import HTTPError
 from tqdm.auto import tqdm
-from tqdm_joblib import tqdm_joblib
 
+from .cache import Level2Cache, get_level2_cache
 from .constants import TIMESTAMP_DELTA
-from .replay import resolve_edit
+from .csrgraph import CSRGraph
+from .deltatable import DeltaTable
+from .networkdelta import NODE_DTYPE
+from .parallel import parallel_map
+from .replay import ComponentTracker, StateHistory
+from .scheduler import schedule_client
 from .types import Integer
 
 
@@ -18,8 +24,19 @@ def _sort_edgelist(edgelist: np.ndarray) -> np.ndarray:
 
 
 def _get_level2_nodes_edges(
-    root_id: Integer, client: CAVEclient, bounds: Optional[np.ndarray] = None
+    root_id: Integer,
+    client: CAVEclient,
+    bounds: Optional[np.ndarray] = None,
+    cache: Optional[Level2Cache] = None,
 ) -> tuple[np.ndarray, np.ndarray]:
+    if cache is None:
+        cache = get_level2_cache()
+    if cache is not None:
+        datastack = getattr(client, "datastack_name", None)
+        cached = cache.get(datastack, root_id, bounds)
+        if cached is not None:
+            return cached
+
     try:
         edgelist = client.chunkedgraph.level2_chunk_graph(root_id, bounds=bounds)
         nodelist = set()
@@ -35,27 +52,125 @@ def _get_level2_nodes_edges(
                 f"HTTPError: level 2 chunk graph not found for root_id: {root_id}"
             )
         else:
-            edgelist = np.empty((0, 2), dtype=int)
+            edgelist = np.empty((0, 2), dtype=NODE_DTYPE)
 
     if len(edgelist) == 0:
-        edgelist = np.empty((0, 2), dtype=int)
+        edgelist = np.empty((0, 2), dtype=NODE_DTYPE)
     else:
-        edgelist = np.array(edgelist, dtype=int)
+        edgelist = np.array(edgelist, dtype=NODE_DTYPE)
 
     edgelist = _sort_edgelist(edgelist)
 
-    nodelist = np.array(nodelist, dtype=int)
+    nodelist = np.array(nodelist, dtype=NODE_DTYPE)
     nodelist = np.unique(nodelist)
 
+    if cache is not None:
+        cache.put(datastack, root_id, bounds, nodelist, edgelist)
+
     return nodelist, edgelist
 
 
+def _get_level2_chunk_layout(client: CAVEclient) -> Optional[dict]:
+    """Get what is needed to find the spatial extent of a level2 node's chunk from its
+    ID, or None if the chunkedgraph does not describe its layout."""
+    try:
+        info = client.chunkedgraph.segmentation_info
+        graph_info = info["graph"]
+        n_bits_for_layer_id = int(graph_info["n_bits_for_layer_id"])
+        spatial_bit_masks = graph_info["spatial_bit_masks"]
+        if "2" in spatial_bit_masks:
+            n_bits_per_dim = int(spatial_bit_masks["2"])
+        else:
+            n_bits_per_dim = int(spatial_bit_masks[2])
+        chunk_size = np.array(graph_info["chunk_size"], dtype=float)
+        cv_mip = int(graph_info.get("cv_mip", 0))
+        base_scale = info["scales"][0]
+        scale = info["scales"][cv_mip]
+        # express chunks in base resolution voxels, which is what bounds are given in
+        mip_factor = np.array(scale["resolution"], dtype=float) / np.array(
+            base_scale["resolution"], dtype=float
+        )
+        voxel_offset = np.array(scale.get("voxel_offset", [0, 0, 0]), dtype=float)
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+        return None
+    return {
+        "n_bits_for_layer_id": n_bits_for_layer_id,
+        "n_bits_per_dim": n_bits_per_dim,
+        "chunk_size": chunk_size * mip_factor,
+        "voxel_offset": voxel_offset * mip_factor,
+    }
+
+
+def _get_level2_chunk_coordinates(node_ids: np.ndarray, layout: dict) -> np.ndarray:
+    """Decode the (x, y, z) chunk coordinates from level2 node IDs."""
+    node_ids = np.asarray(node_ids, dtype=np.uint64)
+    n_bits = layout["n_bits_per_dim"]
+    mask = np.uint64((1 << n_bits) - 1)
+    x_offset = 64 - layout["n_bits_for_layer_id"] - n_bits
+    coordinates = np.empty((len(node_ids), 3), dtype=np.int64)
+    for dim in range(3):
+        shift = np.uint64(x_offset - dim * n_bits)
+        coordinates[:, dim] = (node_ids >> shift) & mask
+    return coordinates
+
+
+def _get_level2_chunk_extents(
+    node_ids: np.ndarray, layout: dict
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the start and stop voxels in base resolution of each level2 node's chunk."""
+    chunk_starts = (
+        _get_level2_chunk_coordinates(node_ids, layout) * layout["chunk_size"]
+        + layout["voxel_offset"]
+    )
+    chunk_stops = chunk_starts + layout["chunk_size"]
+    return chunk_starts, chunk_stops
+
+
+def _level2_nodes_touch_bounds(
+    node_ids: np.ndarray, bounds: np.ndarray, layout: dict
+) -> bool:
+    """Whether any of the level2 nodes are in a chunk which reaches the edge of
+    `bounds`, given as a (3, 2) array of start and stop voxels in base resolution, and
+    so may extend past it."""
+    if len(node_ids) == 0:
+        return False
+    bounds = np.asarray(bounds, dtype=float)
+    chunk_starts, chunk_stops = _get_level2_chunk_extents(node_ids, layout)
+    return bool(
+        np.any((chunk_starts <= bounds[:, 0]) | (chunk_stops >= bounds[:, 1]))
+    )
+
+
+def _crop_level2_nodes_edges(
+    nodes: np.ndarray, edges: np.ndarray, bounds: np.ndarray, layout: dict
+) -> tuple[np.ndarray, np.ndarray]:
+    """Restrict a level2 graph to the nodes in chunks which intersect `bounds`, given
+    as a (3, 2) array of start and stop voxels in base resolution.
+
+    As with the graphs returned by the chunkedgraph, nodes are those which are part of
+    an edge, unless a node had no edges to begin with.
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    chunk_starts, chunk_stops = _get_level2_chunk_extents(nodes, layout)
+    in_bounds = np.all(
+        (chunk_starts < bounds[:, 1]) & (chunk_stops > bounds[:, 0]), axis=1
+    )
+    isolated = ~np.isin(nodes, edges)
+
+    kept_nodes = nodes[in_bounds]
+    edge_mask = np.isin(edges[:, 0], kept_nodes) & np.isin(edges[:, 1], kept_nodes)
+    edges = edges[edge_mask]
+    nodes = nodes[in_bounds & (isolated | np.isin(nodes, edges))]
+    return nodes, edges
+
+
 def get_node_aliases(
     supervoxel_id, client, stop_layer=2, return_as="list"
 ) -> Union[list, pd.DataFrame]:
     """For a given supervoxel, get the node that it was part of at `stop_layer` for
     each timestamp.
     """
+    client = schedule_client(client)
     current_ts = client.timestamp
 
     node_id = client.chunkedgraph.get_roots(
@@ -148,6 +263,7 @@ def get_component_masks(components: list[set]):
 def get_nucleus_supervoxel(root_id, client):
     """Get the supervoxel corresponding to the nucleus of a neuron by looking it up
     in the soma table."""
+    client = schedule_client(client)
     nuc_table = client.info.get_datastack_info()["soma_table"]
     nuc_info = client.materialize.query_table(
         nuc_table, filter_equal_dict=dict(pt_root_id=root_id), log_warning=False
@@ -162,11 +278,21 @@ def get_nucleus_supervoxel(root_id, client):
 
 
 def get_nodes_aliases(
-    supervoxel_ids, client, stop_layer=2, verbose=True, return_as="list"
+    supervoxel_ids,
+    client,
+    stop_layer=2,
+    verbose=True,
+    return_as="list",
+    n_jobs=-1,
+    executor=None,
 ):
     """For a list of supervoxels, get all of the nodes at `stop_layer` that they were
-    part of across time."""
+    part of across time.
 
+    Up to `n_jobs` histories are looked up at once; `executor` overrides the one set by
+    `set_executor`."""
+
+    client = schedule_client(client)
     if not isinstance(supervoxel_ids, list):
         supervoxel_ids = list(supervoxel_ids)
 
@@ -174,7 +300,7 @@ def get_nodes_aliases(
     current_ts = client.timestamp
     chunk_size = 50_000
     supervoxel_id_chunks = np.array_split(
-        supervoxel_ids, len(supervoxel_ids) // chunk_size
+        supervoxel_ids, max(len(supervoxel_ids) // chunk_size, 1)
     )
     node_ids_by_chunk = []
     for supervoxel_id_chunk in supervoxel_id_chunks:
@@ -203,11 +329,14 @@ def get_nodes_aliases(
     # TODO this could be a bit faster if we wrote a smarter implementation since
     # some nodes may end up in the same history, don't think would be a huge speedup,
     # though
-    with tqdm_joblib(total=len(supervoxels_to_lookup), disable=not verbose):
-        historical_l2_ids = Parallel(n_jobs=-1)(
-            delayed(lambda sv: get_node_aliases(sv, client))(sv)
-            for sv in supervoxels_to_lookup
-        )
+    historical_l2_ids = parallel_map(
+        lambda sv: get_node_aliases(sv, client),
+        supervoxels_to_lookup,
+        executor=executor,
+        client=client,
+        n_jobs=n_jobs,
+        verbose=verbose,
+    )
 
     supervoxel_historical_l2_ids = {
         sv: l2s for sv, l2s in zip(supervoxels_to_lookup, historical_l2_ids)
@@ -301,47 +430,67 @@ def get_nodes_aliases(
 # level2_id_components
 
 
-def get_used_node_ids(initial_graph, edits, anchor_nodes):
+def get_used_node_ids(
+    initial_graph, edits=None, anchor_nodes=None, verbose: bool = False
+) -> np.ndarray:
     """Starting from an initial graph and a series of edits, get the nodes that are
     used in at least one state of the graph throughout its history.
 
+    The used nodes are kept as a running union while the edits are replayed, so no
+    individual states are stored. If the states have already been computed with
+    `apply_edit_sequence`, pass its output instead to skip the replay entirely.
+
     Parameters
     ----------
-    initial_graph : nx.Graph
-        The initial graph to start from.
+    initial_graph : nx.Graph, CSRGraph, StateHistory or dict
+        The initial graph to start from. Alternatively, the output of
+        `apply_edit_sequence` for a single object, either as a `StateHistory` or as a
+        dictionary of node sets or graphs, in which case `edits` and `anchor_nodes`
+        are ignored.
     edits : dict
         A dictionary of edits where the key is the `operation_id` and the value is a
         `NetworkDelta` object.
     anchor_nodes : list
         A list of nodes that are on the object of interest, used to pick the connected
         component to consider at each point in the history.
+    verbose : bool
+        Whether to display a progress bar while replaying edits.
 
     Returns
     -------
     :
         Nodes that are ever used in the history of the graph.
     """
-    graph = initial_graph.copy()
-
-    components = []
-    subgraphs = []
-
-    # remember to include the initial state
-    edits = {-1: None, **edits}
-
-    # after each edit, apply it and store the connected component for the nucleus node
-    for edit_id, delta in edits.items():
-        component = resolve_edit(graph, delta, anchor_nodes)
-        components.append(component)
-
-        subgraph = graph.subgraph(component).copy()
-        subgraphs.append(subgraph)
+    if isinstance(initial_graph, StateHistory):
+        # every node used is either in the first state or added by some delta
+        used_nodes = set(initial_graph.nodes)
+        for delta in initial_graph.deltas.values():
+            used_nodes.update(delta.added_nodes)
+    elif isinstance(initial_graph, Mapping):
+        used_nodes = set()
+        for state in initial_graph.values():
+            if isinstance(state, (nx.Graph, CSRGraph)):
+                state = state.nodes()
+            used_nodes.update(state)
+    else:
+        if edits is None or anchor_nodes is None:
+            raise ValueError(
+                "`edits` and `anchor_nodes` are required when starting from a graph."
+            )
+        tracker = ComponentTracker(initial_graph.copy(), anchor_nodes)
+        used_nodes = set(tracker.component)
+        for delta in tqdm(
+            [None, *edits.values()], disable=not verbose, desc="Applying edits"
+        ):
+            used_nodes.update(tracker.apply(delta).added_nodes)
 
-    return np.unique(np.concatenate([list(c) for c in components]))
+    return np.unique(np.array(list(used_nodes)))
 
 
 def get_changed_nodes(edits):
     """From a set of edits, get the nodes that have changed (added or removed)."""
+    if isinstance(edits, DeltaTable):
+        return edits.changed_nodes()
     changed_nodes = []
     for _, edit in edits.items():
         if edit is not None:
@@ -350,9 +499,10 @@ def get_changed_nodes(edits):
     return np.unique(changed_nodes)
 
 
-def get_supervoxel_mappings(supervoxel_ids, edits, client, n_jobs=-1):
+def get_supervoxel_mappings(supervoxel_ids, edits, client, n_jobs=-1, executor=None):
     """For a set of supervoxels and edits, get a mapping between the supervoxels and
     any level2 nodes they could have been part of across time."""
+    client = schedule_client(client)
     # from our set of edits, get and level2 nodes that might have changed
     changed_nodes = get_changed_nodes(edits)
 
@@ -363,10 +513,15 @@ def get_supervoxel_mappings(supervoxel_ids, edits, client, n_jobs=-1):
         mask = np.isin(supervoxels, supervoxel_ids)
         return supervoxels[mask]
 
-    with tqdm_joblib(desc="Getting leaves", total=len(changed_nodes)):
-        leaves_by_l2 = Parallel(n_jobs=n_jobs)(
-            delayed(check_leaves)(node) for node in changed_nodes
-        )
+    leaves_by_l2 = parallel_map(
+        check_leaves,
+        changed_nodes,
+        executor=executor,
+        client=client,
+        n_jobs=n_jobs,
+        verbose=True,
+        desc="Getting leaves",
+    )
 
     # store the mapping of supervoxels to level2 nodes that we got from looking at what
     # changed
@@ -387,7 +542,7 @@ def get_supervoxel_mappings(supervoxel_ids, edits, client, n_jobs=-1):
     # for those, simply look up their level2 nodes now
     chunk_size = 10000
     supervoxel_chunks = np.array_split(
-        unchanged_supervoxels, len(unchanged_supervoxels) // chunk_size
+        unchanged_supervoxels, max(len(unchanged_supervoxels) // chunk_size, 1)
     )
     for supervoxel_chunk in tqdm(supervoxel_chunks, desc="Getting remaining level2s"):
         level2_ids = client.chunkedgraph.get_roots(supervoxel_chunk, stop_layer=2)
@@ -398,6 +553,7 @@ def get_supervoxel_mappings(supervoxel_ids, edits, client, n_jobs=-1):
 
 
 def get_nucleus_location(root_id, client):
+    client = schedule_client(client)
     nuc_table = client.info.get_datastack_info()["soma_table"]
     nuc_info = client.materialize.query_table(
         nuc_table,